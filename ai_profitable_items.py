@@ -1,39 +1,33 @@
 import os
-from dotenv import load_dotenv
-from openai import OpenAI
-from supabase import create_client, Client
-from slack_sdk import WebClient
+import clients
+import llm_cache
+import slack_notify
 
-load_dotenv()
+clients.load_env()
 
 # ==============================
 # 環境変数の読み込み
 # ==============================
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-SLACK_TOKEN = os.getenv("SLACK_TOKEN")
 SLACK_CHANNEL = os.getenv("SLACK_CHANNEL")
-
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-client = OpenAI(api_key=OPENAI_API_KEY)
-slack_client = WebClient(token=SLACK_TOKEN)
+WEEKLY_CATEGORY = os.getenv("WEEKLY_CATEGORY", "ポケモンカード")  # 週次の行だけを読む（スケジューラーの区分の行を除く）
 
 
 # ==============================
 # Slack送信
 # ==============================
 def send_slack(message: str):
-    slack_client.chat_postMessage(channel=SLACK_CHANNEL, text=message)
+    slack_notify.notify(SLACK_CHANNEL, message)
 
 
 # ==============================
 # Supabaseから最新の市場データを取得
 # ==============================
 def fetch_latest_data():
-    response = supabase.table("sales_data") \
+    response = clients.get_supabase().table("sales_data") \
         .select("*") \
+        .eq("category", WEEKLY_CATEGORY) \
         .order("date", desc=True) \
+        .order("run_at", desc=True, nullsfirst=False) \
         .limit(1) \
         .execute()
 
@@ -57,7 +51,7 @@ def generate_profitable_items_report(data: dict):
 - 平均価格: {data['avg_price']}
 - 中央価格: {data['median_price']}
 - 最低価格: {data['min_price']}
-- 最高価格: {data['max_price']}
+- 最高価格: {data.get('max_price')}
 - 人気キーワード: {data['top_keywords']}
 - 人気キャラ価格分析: {data['top_characters']}
 
@@ -76,21 +70,17 @@ def generate_profitable_items_report(data: dict):
 　（同上）
 """
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "user", "content": prompt}
-        ]
-    )
-
-    return response.choices[0].message.content
+    # 同じ入力行・同じプロンプトなら保存済みの回答を再利用する
+    return llm_cache.cached_completion(clients.get_openai(), "gpt-4o-mini", prompt, row_ids=[data.get("id")])
 
 
 # ==============================
 # メイン処理
 # ==============================
-def main():
-    latest = fetch_latest_data()
+def main(latest=None):
+    # pipeline.pyからは取得済みの最新行を受け取る
+    if latest is None:
+        latest = fetch_latest_data()
 
     if not latest:
         send_slack("⚠️ Supabaseに市場データがありません。利益商品を分析できません。")
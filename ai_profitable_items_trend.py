@@ -1,24 +1,23 @@
 import os
-from dotenv import load_dotenv
-from openai import OpenAI
-from slack_sdk import WebClient
-from supabase import create_client, Client
+import asyncio
+import clients
+import llm_cache
+import slack_notify
 
-load_dotenv()
+clients.load_env()
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-SLACK_TOKEN = os.getenv("SLACK_TOKEN")
 SLACK_CHANNEL = os.getenv("SLACK_CHANNEL")
-
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-client = OpenAI(api_key=OPENAI_API_KEY)
-slack_client = WebClient(token=SLACK_TOKEN)
+TREND_AI_MODE = os.getenv("TREND_AI_MODE", "single")  # single / segmented
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))  # 1回の呼び出しのタイムアウト（秒）
+TREND_PROMPT = os.getenv("TREND_PROMPT", "features")  # features: 特徴量表 / raw: 生データをそのまま貼る
+TREND_AI_PERIODS = int(os.getenv("TREND_AI_PERIODS", "4"))
+WEEKLY_CATEGORY = os.getenv("WEEKLY_CATEGORY", "ポケモンカード")  # 週次の行だけを読む（スケジューラーの区分の行を除く）
+MODEL = "gpt-4o-mini"
 
 
 def send_slack(msg):
-    slack_client.chat_postMessage(channel=SLACK_CHANNEL, text=msg)
+    slack_notify.notify(SLACK_CHANNEL, msg)
 
 
 # ==========================
@@ -26,9 +25,11 @@ def send_slack(msg):
 # ==========================
 def fetch_past_sales_data(limit=4):
     response = (
-        supabase.table("sales_data")
+        clients.get_supabase().table("sales_data")
         .select("*")
+        .eq("category", WEEKLY_CATEGORY)
         .order("date", desc=True)
+        .order("run_at", desc=True, nullsfirst=False)
         .limit(limit)
         .execute()
     )
@@ -38,32 +39,7 @@ def fetch_past_sales_data(limit=4):
 # ==========================
 # AIトレンド利益分析
 # ==========================
-def generate_trend_profit_report(data_list):
-
-    prompt = f"""
-あなたはeBayの利益分析スペシャリストです。
-以下は過去{len(data_list)}回分のポケモンカード市場データです。
-
-このデータを使って、
-「過去のトレンドを踏まえた利益商品候補TOP3」を提案してください。
-
-=== 市場データ ===
-"""
-
-    for idx, data in enumerate(data_list, 1):
-        prompt += f"""
-【第{idx}回目】
-- 日付: {data.get('date')}
-- 販売件数: {data.get('total_sales')}
-- 平均価格: {data.get('avg_price')}
-- 中央価格: {data.get('median_price')}
-- 最低価格: {data.get('min_price')}
-- 最高価格: {data.get('max_price')}
-- 人気キーワード: {data.get('top_keywords')}
-- キャラ別平均価格: {data.get('top_characters')}
-"""
-
-    prompt += """
+TREND_INSTRUCTIONS = """
 === 指示 ===
 上記のデータを分析し、
 ・価格トレンド（上昇/下降）
@@ -87,22 +63,120 @@ def generate_trend_profit_report(data_list):
 　（同上）
 """
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}]
-    )
 
-    return response.choices[0].message.content
+def generate_trend_profit_report(data_list):
 
+    prompt = f"""
+あなたはeBayの利益分析スペシャリストです。
+以下は過去{len(data_list)}回分のポケモンカード市場データです。
+
+このデータを使って、
+「過去のトレンドを踏まえた利益商品候補TOP3」を提案してください。
 
-def main():
-    past_data = fetch_past_sales_data(limit=4)
+=== 市場データ ===
+"""
+
+    if TREND_PROMPT == "raw":
+        for idx, data in enumerate(data_list, 1):
+            prompt += f"""
+【第{idx}回目】
+- 日付: {data.get('date')}
+- 販売件数: {data.get('total_sales')}
+- 平均価格: {data.get('avg_price')}
+- 中央価格: {data.get('median_price')}
+- 最低価格: {data.get('min_price')}
+- 最高価格: {data.get('max_price')}
+- 人気キーワード: {data.get('top_keywords')}
+- キャラ別平均価格: {data.get('top_characters')}
+"""
+        prompt += TREND_INSTRUCTIONS
+    else:
+        # 期間数やキーワード数が増えてもプロンプトが一定サイズに収まるよう特徴量表にする
+        import trend_features  # pandasは使うときだけ読み込む
+        prompt, _ = trend_features.build_prompt(prompt, data_list, TREND_INSTRUCTIONS)
+
+    # 同じ入力行・同じプロンプトなら保存済みの回答を再利用する
+    return llm_cache.cached_completion(clients.get_openai(), MODEL, prompt, row_ids=[d.get("id") for d in data_list])
+
+
+# ==========================
+# セグメント別の並列分析＋統合
+# ==========================
+def build_segment_prompts(data_list):
+    """市場全体とキャラごとに、独立して分析できる小さなプロンプトを作る"""
+    ordered = sorted(data_list, key=lambda d: (d.get("date") or "", d.get("run_at") or ""))
+    segments = {}
+
+    market = "あなたはeBayの利益分析スペシャリストです。\n以下はポケモンカード市場全体の推移です（古い順）。\n"
+    for data in ordered:
+        market += (
+            f"- {data.get('date')}: 販売件数 {data.get('total_sales')} / 平均 {data.get('avg_price')} / "
+            f"中央 {data.get('median_price')} / 人気キーワード {data.get('top_keywords')}\n"
+        )
+    market += "価格トレンド・需要トレンド・キーワードトレンドを3行以内で要約してください。"
+    segments["市場全体"] = market
+
+    names = []
+    for data in ordered:
+        for name in (data.get("top_characters") or {}):
+            if name not in names:
+                names.append(name)
+    for name in names:
+        prompt = f"あなたはeBayの利益分析スペシャリストです。\n「{name}」のカードの推移です（古い順）。\n"
+        for data in ordered:
+            stats = (data.get("top_characters") or {}).get(name, {})
+            prompt += f"- {data.get('date')}: {stats.get('count', 0)}件, 平均 ${stats.get('avg', 0)}\n"
+        prompt += "価格変動と需要の傾向、仕入れ目安価格・予想販売価格・利益率の見込みを3行以内で答えてください。"
+        segments[name] = prompt
+    return segments
+
+
+async def _analyze_segments(data_list):
+    async_client = clients.get_async_openai()
+    semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+    row_ids = [d.get("id") for d in data_list]
+    segments = build_segment_prompts(data_list)
+
+    async def run(name, prompt):
+        async with semaphore:
+            try:
+                return name, await asyncio.wait_for(
+                    llm_cache.cached_completion_async(async_client, MODEL, prompt, row_ids), LLM_TIMEOUT
+                )
+            except Exception as e:
+                print(f"⚠️ セグメント「{name}」の分析に失敗: {e!r}")
+                return name, None
+
+    results = await asyncio.gather(*(run(name, prompt) for name, prompt in segments.items()))
+    return [(name, text) for name, text in results if text]
+
+
+def generate_segmented_trend_report(data_list):
+    """セグメントを並列に分析し、短い統合呼び出しでTOP3にまとめる"""
+    findings = asyncio.run(_analyze_segments(data_list))
+    if not findings:
+        return "⚠️ セグメント分析の結果が得られませんでした。"
+
+    prompt = "あなたはeBayの利益分析スペシャリストです。\n以下はセグメント別の分析結果です。\n\n"
+    for name, text in findings:
+        prompt += f"【{name}】\n{text}\n\n"
+    prompt += TREND_INSTRUCTIONS
+    return llm_cache.cached_completion(clients.get_openai(), MODEL, prompt, row_ids=[d.get("id") for d in data_list])
+
+
+def main(past_data=None):
+    # pipeline.pyからは取得済みの履歴（新しい順）を受け取る
+    if past_data is None:
+        past_data = fetch_past_sales_data(limit=TREND_AI_PERIODS)
 
     if len(past_data) < 2:
         send_slack("⚠️トレンド分析に必要な過去データが不足しています。")
         return
 
-    report = generate_trend_profit_report(past_data)
+    if TREND_AI_MODE == "segmented":
+        report = generate_segmented_trend_report(past_data)
+    else:
+        report = generate_trend_profit_report(past_data)
 
     msg = f"""
 💹 **利益商品レポート（トレンドAI分析）**
@@ -0,0 +1,283 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import subprocess
+import contextlib
+
+import synthetic_items
+
+# ===============================
+# ① ベンチマーク設定
+# ===============================
+# 各ステージは別プロセスで実行し、壁時計時間・CPU時間・スループット・ピークメモリを測る。
+# 結果はベースライン（bench_baseline.json）と比較し、許容幅を超えたら回帰として報告する。
+#   python bench.py                         # 1k / 100k で全ステージ
+#   python bench.py --sizes 10m --stages generate analyze_stream
+#   python bench.py --update-baseline       # 現在の結果をベースラインとして保存
+
+BENCH_BASELINE = os.getenv("BENCH_BASELINE", "bench_baseline.json")
+BENCH_TOLERANCE = float(os.getenv("BENCH_TOLERANCE", "0.25"))  # 25%以上悪化したら回帰
+BENCH_PORT = int(os.getenv("BENCH_PORT", "8788"))
+MIN_COMPARABLE_SECONDS = 0.25  # これより短いステージは時間のぶれが大きいので比較しない
+
+DEFAULT_SIZES = ["1k", "100k"]
+LIST_LIMIT = 1_000_000  # これを超える件数ではリストを作るステージを省略する
+FETCH_PAGE = 200
+OFFSET_CAP = 10000
+
+
+# ===============================
+# ② ステージ（子プロセス側）
+# ===============================
+def _rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def stage_generate(total, seed):
+    count = 0
+    for page in synthetic_items.iter_pages(total, FETCH_PAGE, seed):
+        count += len(page)
+    return count
+
+
+def stage_fetch(total, seed, concurrency=1):
+    import jp_pokemon_sales_no_sort as sales
+    pages = -(-min(total, OFFSET_CAP) // FETCH_PAGE)
+    items = sales.fetch_all_items(limit=FETCH_PAGE, max_pages=pages, concurrency=concurrency)
+    return len(items)
+
+
+def stage_analyze(total, seed, items):
+    import jp_pokemon_sales_no_sort as sales
+    sales.analyze_items(items)
+    return len(items)
+
+
+def stage_analyze_stream(total, seed):
+    import jp_pokemon_sales_no_sort as sales
+    sales.analyze_items_stream(synthetic_items.iter_pages(total, FETCH_PAGE, seed))
+    return total
+
+
+def _report_rows(total, seed):
+    """create_report用に、キーワード・キャラ数がtotal件相当の2期間分の行を作る"""
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    names = [f"kw{i}" for i in range(total)]
+    rows = []
+    for date in ("2026-01-01", "2026-01-08"):
+        counts = rng.integers(0, 50, total).tolist()
+        avgs = np.round(rng.uniform(5, 500, total), 2).tolist()
+        rows.append({
+            "date": date,
+            "total_sales": int(rng.integers(100, 1000)),
+            "avg_price": float(rng.uniform(20, 80)),
+            "top_keywords": dict(zip(names, counts)),
+            "top_characters": {n: {"count": c, "avg": a} for n, c, a in zip(names, counts, avgs)},
+        })
+    return rows
+
+
+def stage_create_report(total, seed, rows):
+    import trend_report
+    trend_report.create_report(*rows)
+    return total
+
+
+STAGES = {
+    "generate": {"max": None},
+    "fetch": {"max": None, "server": True},
+    "fetch_async": {"max": None, "server": True},
+    "analyze": {"max": LIST_LIMIT},
+    "analyze_stream": {"max": None},  # ページ生成の時間も含む（generateとの差が集計分）
+    "create_report": {"max": LIST_LIMIT},
+}
+
+
+def run_child(stage, total, seed, out_path):
+    """1ステージを測定してJSONに書き出す（セットアップ時間は含めない）"""
+    setup = None
+    if stage == "analyze":
+        # 本番と同じく、取得時にレコードへ変換済みのリストを渡す
+        import item_records
+        setup = item_records.as_records(synthetic_items.generate_items(total, seed))
+    elif stage == "create_report":
+        setup = _report_rows(total, seed)
+    rss_before = _rss_mb()
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        cpu_start = _cpu_seconds()
+        started = time.perf_counter()
+        if stage == "generate":
+            count = stage_generate(total, seed)
+        elif stage == "fetch":
+            count = stage_fetch(total, seed)
+        elif stage == "fetch_async":
+            count = stage_fetch(total, seed, concurrency=8)
+        elif stage == "analyze":
+            count = stage_analyze(total, seed, setup)
+        elif stage == "analyze_stream":
+            count = stage_analyze_stream(total, seed)
+        else:
+            count = stage_create_report(total, seed, setup)
+        wall = time.perf_counter() - started
+        cpu = _cpu_seconds() - cpu_start
+
+    result = {
+        "items": count,
+        "wall_s": round(wall, 4),
+        "cpu_s": round(cpu, 4),
+        "items_per_s": round(count / wall, 1) if wall > 0 else None,
+        "rss_before_mb": round(rss_before, 1),
+        "peak_rss_mb": round(_rss_mb(), 1),
+    }
+    with open(out_path, "w") as f:
+        json.dump(result, f)
+
+
+# ===============================
+# ③ 実行と比較（親プロセス側）
+# ===============================
+def _child_env(port):
+    env = dict(os.environ)
+    env.update({
+        "EBAY_BROWSE_URL": f"http://127.0.0.1:{port}/buy/browse/v1/item_summary/search",
+        "EBAY_PAGE_DELAY": "0",
+        "EBAY_FETCH_RATE": env.get("BENCH_FETCH_RATE", "1000"),
+        "EBAY_CACHE_MODE": "off",
+        "SALES_ARCHIVE": "0",
+        "SUPABASE_ITEM_ROWS": "0",
+        # 保存処理は測定対象外（接続情報を空にしてSupabaseへは送らない）
+        "SUPABASE_URL": "",
+        "SUPABASE_KEY": "",
+    })
+    return env
+
+
+@contextlib.contextmanager
+def browse_server(size, seed, latency, throttle_rate, port):
+    """Browse APIスタブを別プロセスで起動（サーバー側の負荷を測定値に含めない）"""
+    process = subprocess.Popen(
+        [sys.executable, "browse_stub.py", "--port", str(port), "--size", size, "--seed", str(seed),
+         "--latency", str(latency), "--throttle-rate", str(throttle_rate)],
+        stdout=subprocess.DEVNULL, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    try:
+        import socket
+        for _ in range(100):
+            with socket.socket() as sock:
+                if sock.connect_ex(("127.0.0.1", port)) == 0:
+                    break
+            time.sleep(0.05)
+        yield
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def run_stage(stage, size, seed, port):
+    out_path = f".bench-{os.getpid()}-{stage}-{size}.json"
+    try:
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", stage, size, str(seed), out_path],
+            env=_child_env(port), check=True,
+        )
+        with open(out_path) as f:
+            return json.load(f)
+    finally:
+        if os.path.exists(out_path):
+            os.remove(out_path)
+
+
+def compare(key, result, baseline, tolerance=BENCH_TOLERANCE):
+    """ベースラインより悪化した指標のリストを返す"""
+    base = baseline.get(key)
+    if not base:
+        return []
+    problems = []
+    if base["wall_s"] >= MIN_COMPARABLE_SECONDS and result["wall_s"] > base["wall_s"] * (1 + tolerance):
+        problems.append(f"時間 {base['wall_s']:.3f}s → {result['wall_s']:.3f}s")
+    if result["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance):
+        problems.append(f"メモリ {base['peak_rss_mb']:.0f}MB → {result['peak_rss_mb']:.0f}MB")
+    return problems
+
+
+def load_baseline(path=BENCH_BASELINE):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get("results", {})
+
+
+def save_baseline(results, path=BENCH_BASELINE):
+    merged = load_baseline(path)
+    merged.update(results)
+    with open(path, "w") as f:
+        json.dump({
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": dict(sorted(merged.items())),
+        }, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def main(sizes, stages, seed=0, latency=0.0, throttle_rate=0.0, update=False, port=BENCH_PORT):
+    baseline = load_baseline()
+    results, regressions = {}, []
+    print(f"{'stage/size':<22} {'件数':>9} {'時間(s)':>9} {'件/秒':>11} {'ピークMB':>9}  判定")
+
+    for size in sizes:
+        total = synthetic_items.parse_size(size)
+        server_stages = [s for s in stages if STAGES[s].get("server")]
+        server = browse_server(size, seed, latency, throttle_rate, port) if server_stages else contextlib.nullcontext()
+        with server:
+            for stage in stages:
+                limit = STAGES[stage]["max"]
+                if limit is not None and total > limit:
+                    print(f"{stage + '/' + size:<22} {'-':>9} {'（件数が多すぎるため省略）':>9}")
+                    continue
+                key = f"{stage}/{size}"
+                result = run_stage(stage, size, seed, port)
+                results[key] = result
+                problems = compare(key, result, baseline)
+                regressions += [(key, p) for p in problems]
+                verdict = "⚠️ 回帰" if problems else ("✅" if key in baseline else "🆕")
+                print(f"{key:<22} {result['items']:>9} {result['wall_s']:>9.3f} "
+                      f"{result['items_per_s'] or 0:>11,.0f} {result['peak_rss_mb']:>9.1f}  {verdict}")
+
+    if update:
+        save_baseline(results)
+        print(f"💾 ベースラインを更新しました: {BENCH_BASELINE}")
+    if regressions:
+        print("\n⚠️ ベースラインからの回帰:")
+        for key, problem in regressions:
+            print(f"- {key}: {problem}")
+    return regressions
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 6 and sys.argv[1] == "--child":
+        _, _, stage, size, seed, out_path = sys.argv
+        run_child(stage, synthetic_items.parse_size(size), int(seed), out_path)
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="取得・分析・レポート各ステージのベンチマーク")
+    parser.add_argument("--sizes", nargs="*", default=DEFAULT_SIZES, help="件数（1k / 100k / 10m）")
+    parser.add_argument("--stages", nargs="*", default=list(STAGES), choices=list(STAGES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="スタブの1リクエストあたりの遅延（秒）")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="スタブが429を返す確率")
+    parser.add_argument("--update-baseline", action="store_true", help="結果をベースラインとして保存")
+    args = parser.parse_args()
+
+    found = main(args.sizes, args.stages, args.seed, args.latency, args.throttle_rate, args.update_baseline)
+    sys.exit(1 if found and not args.update_baseline else 0)
@@ -0,0 +1,107 @@
+import json
+import time
+import random
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import synthetic_items
+
+# ===============================
+# ① ローカル用Browse API互換サーバー
+# ===============================
+# EBAY_BROWSE_URL=http://127.0.0.1:8788/buy/browse/v1/item_summary/search を指定すると、
+# item_summary/search を合成データ（synthetic_items.py）でオフラインに再現する。
+# 遅延と429（Retry-After付き）を注入でき、offset上限もBrowse APIと同じく再現する。
+
+
+class BrowseStub:
+    """total件の合成データをoffset/limitでページングして返すスタブ"""
+
+    def __init__(self, total=1000, seed=0, latency=0.0, throttle_rate=0.0, retry_after=1, offset_cap=10000):
+        self.total = total
+        self.seed = seed
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.offset_cap = offset_cap
+        self.requests = 0
+        self.throttled = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def search(self, query):
+        """(ステータス, ヘッダー, 本文)を返す"""
+        with self._lock:
+            self.requests += 1
+            throttle = self._rng.random() < self.throttle_rate
+            if throttle:
+                self.throttled += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if throttle:
+            return 429, {"Retry-After": str(self.retry_after)}, {"errors": [{"errorId": 2001, "message": "Too many requests."}]}
+
+        limit = min(int(query.get("limit", ["50"])[0]), 200)
+        offset = int(query.get("offset", ["0"])[0])
+        if offset + limit > self.offset_cap:
+            return 400, {}, {"errors": [{"errorId": 12023, "message": "The 'offset' value exceeds the maximum."}]}
+
+        body = {"total": self.total, "limit": limit, "offset": offset}
+        items = synthetic_items.get_items(offset, limit, self.total, self.seed)
+        if items:
+            body["itemSummaries"] = items
+        return 200, {}, body
+
+
+def _make_handler(stub):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if not url.path.rstrip("/").endswith("/item_summary/search"):
+                status, headers, body = 404, {}, {"errors": [{"message": "not found"}]}
+            else:
+                status, headers, body = stub.search(parse_qs(url.query))
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+def serve(port=8788, **options):
+    """バックグラウンドスレッドでスタブを起動し、(server, stub)を返す"""
+    stub = BrowseStub(**options)
+    server = ThreadingHTTPServer(("127.0.0.1", port), _make_handler(stub))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stub
+
+
+def search_url(port=8788):
+    return f"http://127.0.0.1:{port}/buy/browse/v1/item_summary/search"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ローカル用Browse API互換スタブ")
+    parser.add_argument("--port", type=int, default=8788)
+    parser.add_argument("--size", default="1k", help="総件数（1k / 100k / 10m または数値）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="1リクエストにかける秒数")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="429を返す確率")
+    parser.add_argument("--retry-after", type=int, default=1, help="429時のRetry-After秒数")
+    args = parser.parse_args()
+
+    stub = BrowseStub(total=synthetic_items.parse_size(args.size), seed=args.seed, latency=args.latency,
+                      throttle_rate=args.throttle_rate, retry_after=args.retry_after)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), _make_handler(stub))
+    print(f"🧪 Browse APIスタブ起動: {search_url(args.port)}（EBAY_BROWSE_URLに指定）")
+    server.serve_forever()
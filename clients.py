@@ -0,0 +1,94 @@
+import os
+import threading
+
+# ===============================
+# ① 共通クライアントの遅延生成
+# ===============================
+# importしただけでは通信もクライアント生成も行わず、
+# 最初に使われたときに1回だけ作って全モジュールで使い回す。
+
+_lock = threading.RLock()
+_clients = {}
+_env_loaded = False
+
+
+def load_env():
+    """.envの読み込み（何度呼ばれても1回だけ）"""
+    global _env_loaded
+    if _env_loaded:
+        return
+    with _lock:
+        if not _env_loaded:
+            from dotenv import load_dotenv
+            load_dotenv()
+            _env_loaded = True
+
+
+def _get(name, factory):
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                load_env()
+                client = factory()
+                _clients[name] = client
+    return client
+
+
+def get_supabase(optional=False):
+    """Supabaseクライアント（optional=Trueなら未設定時にNoneを返す）"""
+    load_env()
+    url, key = os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY")
+    if not (url and key):
+        if optional:
+            return None
+        raise RuntimeError("SUPABASE_URL / SUPABASE_KEY が設定されていません。.envを確認してください。")
+
+    def factory():
+        from supabase import create_client
+        return create_client(url, key)
+    return _get("supabase", factory)
+
+
+def get_openai():
+    def factory():
+        from openai import OpenAI
+        return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _get("openai", factory)
+
+
+def get_async_openai():
+    """AsyncOpenAIクライアント（接続は実行中のイベントループに結びつくため、ループが変わったら作り直す）"""
+    import asyncio
+    loop = asyncio.get_running_loop()
+    with _lock:
+        entry = _clients.get("async_openai")
+        if entry is None or entry[0] is not loop:
+            load_env()
+            from openai import AsyncOpenAI
+            entry = _clients["async_openai"] = (loop, AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY")))
+    return entry[1]
+
+
+def get_slack():
+    def factory():
+        from slack_sdk import WebClient
+        return WebClient(token=os.getenv("SLACK_TOKEN"))
+    return _get("slack", factory)
+
+
+def get_http_session():
+    """keep-aliveで接続を使い回すrequests.Session（スレッド間で共有）"""
+    def factory():
+        import requests
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=int(os.getenv("HTTP_POOL_CONNECTIONS", "4")),  # 接続先ホストごとのプール数
+            pool_maxsize=int(os.getenv("HTTP_POOL_SIZE", "16")),  # 1ホストあたりのkeep-alive接続数
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+    return _get("http", factory)
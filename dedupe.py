@@ -0,0 +1,148 @@
+import os
+import re
+import zlib
+
+import numpy as np
+
+import metrics
+import item_records
+
+# ===============================
+# ① 重複出品検出の設定
+# ===============================
+# 同じ出品者が、タイトルを少し変えただけの同じカードを何度も出品することがある。
+# タイトルの文字n-gramからMinHash署名を作り、LSH（バンド分割）で候補だけを比較するので、
+# 全組み合わせを比べずにほぼ線形の計算量でまとめられる。
+DEDUPE_LISTINGS = os.getenv("DEDUPE_LISTINGS", "0") == "1"  # 1なら集計前に重複出品をまとめる
+DEDUPE_THRESHOLD = float(os.getenv("DEDUPE_THRESHOLD", "0.8"))  # タイトルの推定Jaccard類似度の下限
+DEDUPE_PRICE_TOLERANCE = float(os.getenv("DEDUPE_PRICE_TOLERANCE", "0.05"))  # 価格差の許容率
+
+SHINGLE = 4  # n-gramの長さ（UTF-8のバイト数。32bit整数1つに収まる）
+NUM_PERM = 64  # MinHashの関数の数
+BANDS = 16  # LSHのバンド数（1バンド NUM_PERM // BANDS 行）
+ROWS = NUM_PERM // BANDS
+CHUNK = 2000  # 署名をまとめて計算する件数
+
+# ハッシュ関数族は 32bit の乗算・加算（オーバーフローで折り返し）で作る
+_rng = np.random.default_rng(20240101)
+_A = _rng.integers(1, 1 << 32, NUM_PERM, dtype=np.uint64).astype(np.uint32) | np.uint32(1)
+_B = _rng.integers(0, 1 << 32, NUM_PERM, dtype=np.uint64).astype(np.uint32)
+_BAND_MIX = _rng.integers(1, 1 << 63, (BANDS, ROWS), dtype=np.uint64) | np.uint64(1)
+
+NORMALIZE_RE = re.compile(r"[\W_]+")
+
+
+# ===============================
+# ② MinHash署名
+# ===============================
+def normalize(title):
+    return " ".join(NORMALIZE_RE.sub(" ", (title or "").lower()).split())
+
+
+def shingles(titles):
+    """正規化したタイトルの4バイトn-gramを32bit整数として並べ、(値, タイトルごとの開始位置)を返す"""
+    encoded = [normalize(t).encode("utf-8").ljust(SHINGLE, b" ") for t in titles]
+    lengths = np.array([len(e) for e in encoded])
+    buf = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint32)
+    grams = buf[:-3] | (buf[1:-2] << 8) | (buf[2:-1] << 16) | (buf[3:] << 24)
+    # タイトルの境界をまたぐ末尾3つの窓を除く
+    ends = np.cumsum(lengths)
+    valid = np.ones(len(buf), dtype=bool)
+    valid[(ends[:, None] - np.arange(1, SHINGLE)).ravel()] = False
+    starts = np.concatenate(([0], np.cumsum(lengths - SHINGLE + 1)[:-1]))
+    return grams[valid[:len(grams)]], starts
+
+
+def signatures(titles):
+    """タイトルごとのMinHash署名（件数 × NUM_PERM の配列）をまとめて計算"""
+    if not titles:
+        return np.empty((0, NUM_PERM), dtype=np.uint32)
+    grams, starts = shingles(titles)
+    with np.errstate(over="ignore"):
+        mixed = grams * np.uint32(0x9E3779B1)
+        mixed ^= mixed >> np.uint32(15)
+        permuted = _A[:, None] * mixed[None, :] + _B[:, None]
+    return np.minimum.reduceat(permuted, starts, axis=1).T
+
+
+def band_keys(sigs, sellers):
+    """バンドごとの署名と出品者をまとめた整数キー（件数 × BANDS）。同じ出品者の中だけで候補を探す"""
+    with np.errstate(over="ignore"):
+        keys = (sigs.reshape(len(sigs), BANDS, ROWS).astype(np.uint64) * _BAND_MIX).sum(axis=2)
+        seller_hash = np.array([zlib.crc32(s.encode("utf-8")) for s in sellers], dtype=np.uint64)
+        keys ^= seller_hash[:, None] * np.uint64(0x9E3779B97F4A7C15)
+        keys += np.arange(BANDS, dtype=np.uint64)
+    return keys.tolist()
+
+
+# ===============================
+# ③ LSHで候補を絞って重複をまとめる
+# ===============================
+class Deduper:
+    """代表の出品だけを索引に残し、ページ単位でも全件でも重複を取り除く"""
+
+    def __init__(self, threshold=None, price_tolerance=None):
+        self.threshold = DEDUPE_THRESHOLD if threshold is None else threshold
+        self.price_tolerance = DEDUPE_PRICE_TOLERANCE if price_tolerance is None else price_tolerance
+        self.buckets = {}
+        self.signatures = []
+        self.prices = []
+        self.seen = 0
+        self.collapsed = 0
+
+    @staticmethod
+    def _price(item):
+        return None if item.price != item.price else item.price
+
+    def _same_listing(self, rep, signature, price):
+        rep_price = self.prices[rep]
+        if (rep_price is None) != (price is None):
+            return False
+        if price is not None and abs(rep_price - price) > self.price_tolerance * max(rep_price, price):
+            return False
+        return np.count_nonzero(self.signatures[rep] == signature) >= self.threshold * NUM_PERM
+
+    def _find(self, keys, signature, price):
+        checked = set()
+        for key in keys:
+            for rep in self.buckets.get(key, ()):
+                if rep not in checked:
+                    if self._same_listing(rep, signature, price):
+                        return True
+                    checked.add(rep)
+        return False
+
+    def filter(self, items):
+        """重複を除いたリストを返す（最初に現れた出品を代表として残す）"""
+        items = item_records.as_records(items)
+        kept = []
+        for start in range(0, len(items), CHUNK):
+            chunk = items[start:start + CHUNK]
+            sigs = signatures([item.title for item in chunk])
+            sellers = [item.seller for item in chunk]
+            for item, signature, keys in zip(chunk, sigs, band_keys(sigs, sellers)):
+                price = self._price(item)
+                if self._find(keys, signature, price):
+                    self.collapsed += 1
+                    continue
+
+                rep = len(self.signatures)
+                self.signatures.append(signature)
+                self.prices.append(price)
+                for key in keys:
+                    self.buckets.setdefault(key, []).append(rep)
+                kept.append(item)
+        self.seen += len(items)
+        return kept
+
+    def report(self):
+        metrics.inc("dedupe_collapsed_total", self.collapsed)
+        print(f"🧹 重複出品を {self.collapsed} 件まとめました（{self.seen} → {self.seen - self.collapsed} 件）")
+
+
+def collapse(items, threshold=None, price_tolerance=None):
+    """全件をまとめて重複除去し、(残った出品, まとめた件数)を返す"""
+    deduper = Deduper(threshold, price_tolerance)
+    kept = deduper.filter(items)
+    deduper.report()
+    return kept, deduper.collapsed
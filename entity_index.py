@@ -0,0 +1,184 @@
+import os
+import re
+import json
+import unicodedata
+
+import numpy as np
+
+from streaming_stats import RunningStats, KLLSketch
+
+# ===============================
+# ① エンティティ辞書の設定
+# ===============================
+# entities.json に {種別: {正式名: [別名, ...]}} の形でポケモン全種・弾（セットコード）・
+# レアリティ・鑑定グレードを登録しておき、単語列のトライ木にまとめて1回の走査でタグ付けする。
+# 1タイトルあたりの処理はタイトルの単語数に比例し、登録数を増やしても重くならない。
+ENTITY_FILE = os.getenv("ENTITY_FILE") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "entities.json")
+QUANTILES = (0.1, 0.5, 0.9)  # p10 / 中央値 / p90
+
+# 英数字・カタカナ・その他（漢字・ひらがな）の並びを1単語として区切る
+TOKEN_RE = re.compile(r"[a-z0-9]+|[ァ-ヺー]+|[^\W\da-z_ァ-ヺー]+")
+ASCII_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# アクセント記号・アポストロフィ・性別記号をそろえる（Flabébé / Farfetch'd / Nidoran♀）
+TRANSLATE = str.maketrans({
+    **dict(zip("áàâäãéèêëíìîïóòôöõúùûüçñ", "aaaaaeeeeiiiiooooouuuucn")),
+    "'": None, "’": None, "♀": " f", "♂": " m",
+})
+
+
+def tokenize(text):
+    """全角・半角をそろえて小文字にし、単語のリストにする（英語のみのタイトルは正規化を省く）"""
+    text = (text or "").lower()
+    if text.isascii():
+        return ASCII_TOKEN_RE.findall(text.replace("'", "") if "'" in text else text)
+    return TOKEN_RE.findall(unicodedata.normalize("NFKC", text).lower().translate(TRANSLATE))
+
+
+# ===============================
+# ② トライ木による一括タグ付け
+# ===============================
+class EntityIndex:
+    """単語列のトライ木。各ノードは {単語: 子ノード} で、Noneキーにエンティティ番号を持つ"""
+
+    def __init__(self, entities=None):
+        self.names = []
+        self.kinds = []
+        self.codes = {}
+        self.root = {}
+        for kind, table in (entities or {}).items():
+            for name, aliases in table.items():
+                self.add(kind, name, aliases)
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, kind, name, aliases=()):
+        """正式名と別名を登録（正式名は種別をまたいで一意）"""
+        if name in self.codes:
+            raise ValueError(f"エンティティ名が重複しています: {name}")
+        code = self.codes[name] = len(self.names)
+        self.names.append(name)
+        self.kinds.append(kind)
+        for alias in (name, *aliases):
+            tokens = tokenize(alias)
+            if not tokens:
+                continue
+            node = self.root
+            for token in tokens:
+                node = node.setdefault(token, {})
+            node.setdefault(None, code)
+        return code
+
+    def tag(self, title):
+        """タイトルに含まれるエンティティ番号の集合"""
+        return self.tag_tokens(tokenize(title))
+
+    def tag_tokens(self, tokens):
+        """単語列から単語境界で最長一致・重なりなしにエンティティを拾う"""
+        found = set()
+        get = self.root.get
+        i, n = 0, len(tokens)
+        while i < n:
+            node = get(tokens[i])
+            i += 1
+            if node is None:
+                continue
+            code, end = node.get(None), i
+            j = i
+            while j < n:
+                node = node.get(tokens[j])
+                if node is None:
+                    break
+                j += 1
+                if None in node:
+                    code, end = node[None], j
+            if code is not None:
+                found.add(code)
+                i = end
+        return found
+
+    # ===============================
+    # ③ エンティティ別の価格統計
+    # ===============================
+    def summarize(self, codes, prices):
+        """(エンティティ番号, 価格)の組をまとめて集計し、{正式名: 統計}を返す（ソート1回で全エンティティ分）"""
+        codes = np.asarray(codes, dtype=np.int64)
+        prices = np.asarray(prices, dtype=float)
+        if not len(codes):
+            return {}
+        order = np.lexsort((prices, codes))
+        codes, prices = codes[order], prices[order]
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(codes)) + 1))
+        counts = np.diff(np.append(starts, len(codes)))
+        means = np.add.reduceat(prices, starts) / counts
+        # グループ内は価格順なので、分位点は位置の線形補間で求まる（np.quantileと同じ定義）
+        quantiles = []
+        for q in QUANTILES:
+            position = starts + q * (counts - 1)
+            lo = np.floor(position).astype(np.int64)
+            hi = np.ceil(position).astype(np.int64)
+            quantiles.append(prices[lo] + (prices[hi] - prices[lo]) * (position - lo))
+        p10, median, p90 = quantiles
+        return {
+            self.names[code]: stats_row(count, mean, median[k], p10[k], p90[k])
+            for k, (code, count, mean) in enumerate(zip(codes[starts].tolist(), counts.tolist(), means.tolist()))
+        }
+
+
+def stats_row(count, mean, median, p10, p90):
+    return {"count": int(count), "avg": float(mean), "median": float(median), "p10": float(p10), "p90": float(p90)}
+
+
+class StreamingEntityStats:
+    """ストリーミング集計用。出現したエンティティにだけ件数・平均とKLLスケッチを持つ"""
+
+    def __init__(self, index):
+        self.index = index
+        self.stats = {}
+        self.pending = {}  # ページ分の価格を溜めてからまとめて反映する
+
+    def update(self, codes, price):
+        for code in codes:
+            values = self.pending.get(code)
+            if values is None:
+                self.pending[code] = [price]
+            else:
+                values.append(price)
+
+    def flush(self):
+        for code, values in self.pending.items():
+            entry = self.stats.get(code)
+            if entry is None:
+                entry = self.stats[code] = (RunningStats(), KLLSketch())
+            entry[0].update_many(values)
+            entry[1].update_many(values)
+        self.pending = {}
+
+    def sketch(self, name):
+        """エンティティの価格スケッチ（出現していなければ空のスケッチ）"""
+        self.flush()
+        entry = self.stats.get(self.index.codes[name])
+        return entry[1] if entry else KLLSketch()
+
+    def summarize(self):
+        self.flush()
+        summary = {}
+        for code, (running, sketch) in self.stats.items():
+            p10, median, p90 = sketch.quantiles(QUANTILES)
+            summary[self.index.names[code]] = stats_row(running.count, running.mean, median, p10, p90)
+        return summary
+
+
+# ===============================
+# ④ 読み込み
+# ===============================
+def load(path=None):
+    """entities.json（ENTITY_FILE）からインデックスを作る"""
+    with open(path or ENTITY_FILE, encoding="utf-8") as f:
+        return EntityIndex(json.load(f))
+
+
+def top_by_kind(index, summary, kind, limit):
+    """指定した種別のエンティティを件数の多い順に返す"""
+    rows = [(name, stats) for name, stats in summary.items() if index.kinds[index.codes[name]] == kind]
+    return sorted(rows, key=lambda row: (-row[1]["count"], row[0]))[:limit]
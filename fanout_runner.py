@@ -0,0 +1,88 @@
+import os
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import metrics
+import jp_pokemon_sales_no_sort as sales
+
+# ===============================
+# ① ジョブ設定
+# ===============================
+FANOUT_JOBS = os.getenv("FANOUT_JOBS", "fanout_jobs.json")
+FANOUT_WORKERS = int(os.getenv("FANOUT_WORKERS", "8"))
+
+# 除外キーワードのプロファイル（ジョブの "exclude" で指定）
+EXCLUDE_PROFILES = {
+    "pokemon": sales.EXCLUDE_KEYWORDS,
+    "onepiece": ["pokemon", "yugioh", "weiss", "digimon", "dragon ball", "vanguard", "magic the gathering"],
+    "yugioh": ["pokemon", "one piece", "weiss", "digimon", "dragon ball", "vanguard", "magic the gathering"],
+    "none": [],
+}
+
+
+def load_jobs(path=FANOUT_JOBS):
+    """[{category_id, marketplace, exclude, label}, ...] 形式のジョブ一覧を読み込む"""
+    with open(path, encoding="utf-8") as f:
+        jobs = json.load(f)
+    for job in jobs:
+        job.setdefault("marketplace", sales.MARKETPLACE_ID)
+        job.setdefault("exclude", "pokemon")
+        job.setdefault("label", f"{job['category_id']}@{job['marketplace']}")
+    return jobs
+
+
+# ===============================
+# ② 1ジョブ分の取得＋分析（ワーカープロセス内で実行）
+# ===============================
+def run_job(job, limit=100, max_pages=10):
+    # ワーカーは複数ジョブで使い回されるため、計測はジョブごとに空にしてから取り、親プロセスへ返す
+    metrics.reset()
+    started = time.perf_counter()
+    exclude = job["exclude"]
+    sales.configure(
+        marketplace=job["marketplace"],
+        exclude_keywords=EXCLUDE_PROFILES[exclude] if isinstance(exclude, str) else exclude,
+    )
+    print(f"🚀 [{job['label']}] 取得開始")
+    items = sales.fetch_all_items(category_id=job["category_id"], limit=limit, max_pages=max_pages)
+    row = sales.analyze_items(items, category_id=job["category_id"], category_label=job["label"])
+    return {
+        "label": job["label"],
+        "fetched": len(items),
+        "total_sales": row["total_sales"] if row else 0,
+        "seconds": time.perf_counter() - started,
+        "metrics": metrics.snapshot(),
+    }
+
+
+# ===============================
+# ③ プロセスプールで全ジョブを並列実行
+# ===============================
+def run_all(jobs, workers=FANOUT_WORKERS):
+    """全ジョブを並列実行する（所要時間は最も遅いジョブにほぼ等しい）"""
+    started = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(jobs)))) as pool:
+        futures = {pool.submit(run_job, job): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                result = future.result()
+                metrics.merge(result.pop("metrics"))
+                results.append(result)
+            except Exception as e:
+                print(f"⚠️ [{job['label']}] ジョブ失敗: {e}")
+                results.append({"label": job["label"], "fetched": 0, "total_sales": 0, "seconds": None})
+
+    print(f"\n🧮 ファンアウト結果（{len(jobs)} ジョブ / {time.perf_counter() - started:.1f} 秒）")
+    for r in sorted(results, key=lambda r: r["label"]):
+        seconds = f"{r['seconds']:.1f}秒" if r["seconds"] is not None else "失敗"
+        print(f"- {r['label']} : 取得 {r['fetched']} 件 / 有効 {r['total_sales']} 件（{seconds}）")
+    return results
+
+
+if __name__ == "__main__":
+    print("🌍 eBay 市場分析（カテゴリ×マーケットプレイス一括実行）")
+    run_all(load_jobs())
+    metrics.flush()
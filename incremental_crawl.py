@@ -0,0 +1,124 @@
+import os
+import json
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import item_records
+import jp_pokemon_sales_no_sort as sales
+from shard_crawl import fetch_sharded, IncompleteCrawl
+
+# ===============================
+# ① 差分クロールの設定
+# ===============================
+CHECKPOINT_DB = os.getenv("CHECKPOINT_DB", "ebay_checkpoint.sqlite3")
+WINDOW_DAYS = 90
+OVERLAP = timedelta(hours=1)  # 検索インデックスの反映遅れを吸収する重なり幅
+
+
+# ===============================
+# ② SQLiteチェックポイントストア
+# ===============================
+class CheckpointStore:
+    """取得済みitemIdと最終取得時刻（ウォーターマーク）をカテゴリ別に保持する"""
+
+    def __init__(self, path=CHECKPOINT_DB):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS items (
+                item_id TEXT PRIMARY KEY,
+                category_id TEXT NOT NULL,
+                sold_at TEXT NOT NULL,
+                payload TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_items_category_sold ON items (category_id, sold_at);
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+
+    def watermark(self, category_id):
+        row = self.conn.execute(
+            "SELECT value FROM meta WHERE key = ?", (f"watermark:{category_id}",)
+        ).fetchone()
+        return datetime.fromisoformat(row[0]) if row else None
+
+    def set_watermark(self, category_id, when):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                (f"watermark:{category_id}", when.isoformat()),
+            )
+
+    def add_items(self, category_id, items, fetched_at):
+        """未登録のitemIdだけを保存し、新規分の件数を返す（販売日時がなければ取得時刻）"""
+        fallback = fetched_at.strftime("%Y-%m-%dT%H:%M:%SZ")
+        rows = [
+            (item.item_id, category_id, item.sold_date or fallback, json.dumps(item.to_summary(), ensure_ascii=False))
+            for item in item_records.as_records(items) if item.item_id
+        ]
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO items (item_id, category_id, sold_at, payload) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            return self.conn.total_changes - before
+
+    def prune(self, category_id, before):
+        """集計期間より古い販売データを削除"""
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM items WHERE category_id = ? AND sold_at < ?",
+                (category_id, before.strftime("%Y-%m-%dT%H:%M:%SZ")),
+            )
+
+    def load_items(self, category_id):
+        rows = self.conn.execute(
+            "SELECT payload FROM items WHERE category_id = ? ORDER BY sold_at", (category_id,)
+        )
+        return [item_records.ItemRecord.from_summary(item_records.loads(payload)) for (payload,) in rows]
+
+    def close(self):
+        self.conn.close()
+
+
+# ===============================
+# ③ 差分取得（前回ウォーターマーク以降の販売のみ）
+# ===============================
+def fetch_incremental(category_id="183454", days=WINDOW_DAYS, store=None):
+    """新規販売だけを取得してストアに追加し、直近days日分の全件を返す（ここで開いたストアは閉じる）"""
+    owned = store is None
+    store = store or CheckpointStore()
+    try:
+        end = datetime.now(timezone.utc)
+        window_start = end - timedelta(days=days)
+
+        watermark = store.watermark(category_id)
+        start = window_start if watermark is None else max(window_start, watermark - OVERLAP)
+        print(f"⏱ 差分取得: {start:%Y-%m-%d %H:%M} 〜 {end:%Y-%m-%d %H:%M}")
+
+        complete = True
+        try:
+            delta = fetch_sharded(category_id, start=start, end=end)
+        except IncompleteCrawl as e:
+            # 取得できた分は保存するが、欠けた範囲を次回も取り直せるようウォーターマークは進めない
+            print(f"⚠️ {e}。ウォーターマークは {start:%Y-%m-%d %H:%M} のまま据え置きます")
+            delta, complete = e.items, False
+        added = store.add_items(category_id, delta, end)
+        if complete:
+            store.set_watermark(category_id, end)
+        store.prune(category_id, window_start)
+
+        items = store.load_items(category_id)
+        print(f"🆕 新規販売: {added} 件 / 集計対象（過去{days}日）: {len(items)} 件")
+        return items
+    finally:
+        if owned:
+            store.close()
+
+
+if __name__ == "__main__":
+    print("🌍 eBay ポケモンカード市場分析（差分クロール）")
+    items = fetch_incremental()
+    sales.analyze_items(items)
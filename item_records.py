@@ -0,0 +1,90 @@
+import sys
+import json
+import math
+
+try:
+    import orjson
+except ImportError:  # orjsonがなければ標準のjsonで読む
+    orjson = None
+
+# ===============================
+# ① 出品レコード
+# ===============================
+# Browse APIのitemSummariesは画像・送料・カテゴリなど使わない項目を多く含むため、
+# ページを読み込んだ直後に集計・保存で使う項目だけを取り出し、元の辞書は捨てる。
+# 出品者名と通貨は同じ文字列が繰り返し現れるのでinternして1つを共有する。
+SOLD_DATE_FIELDS = ("itemEndDate", "itemCreationDate", "itemOriginDate")
+
+
+def loads(body):
+    """JSON文字列・バイト列を読み込む（orjsonがあれば使う）"""
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+class ItemRecord:
+    """1出品分の必要な項目だけを持つ軽量レコード（priceは数値化済み・不明ならnan）"""
+
+    __slots__ = ("item_id", "title", "price", "currency", "seller", "sold_date")
+
+    def __init__(self, item_id, title, price, currency, seller, sold_date):
+        self.item_id = item_id
+        self.title = title
+        self.price = price
+        self.currency = currency
+        self.seller = seller
+        self.sold_date = sold_date
+
+    @classmethod
+    def from_summary(cls, item):
+        """Browse APIのitemSummary（またはto_summaryの辞書）から作る"""
+        price = item.get("price") or {}
+        try:
+            value = float(price["value"])
+        except (KeyError, TypeError, ValueError):
+            value = math.nan
+        currency = price.get("currency")
+        seller = (item.get("seller") or {}).get("username") or ""
+        sold_date = None
+        for field in SOLD_DATE_FIELDS:
+            sold_date = item.get(field)
+            if sold_date:
+                break
+        return cls(
+            item.get("itemId"),
+            item.get("title") or "",
+            value,
+            sys.intern(currency) if currency else currency,
+            sys.intern(seller),
+            sold_date,
+        )
+
+    def to_summary(self):
+        """itemSummaryと同じ形の辞書に戻す（チェックポイント保存用）"""
+        price = {} if math.isnan(self.price) else {"value": str(self.price), "currency": self.currency}
+        return {
+            "itemId": self.item_id,
+            "title": self.title,
+            "price": price,
+            "seller": {"username": self.seller},
+            "itemEndDate": self.sold_date,
+        }
+
+    def __repr__(self):
+        return f"ItemRecord({self.item_id!r}, {self.title!r}, {self.price!r})"
+
+
+# ===============================
+# ② ページの読み込み
+# ===============================
+def decode_page(body):
+    """検索結果1ページを読み込み、(レコードのリスト, total)を返す"""
+    data = loads(body)
+    records = [ItemRecord.from_summary(item) for item in data.get("itemSummaries") or ()]
+    return records, data.get("total")
+
+
+def as_records(items):
+    """辞書・レコードが混在していてもレコードのリストにそろえる（レコードはそのまま）"""
+    return [item if type(item) is ItemRecord else ItemRecord.from_summary(item) for item in items]
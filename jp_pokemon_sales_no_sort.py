@@ -1,41 +1,73 @@
 import os
 import re
 import time
-import requests
+import asyncio
 import numpy as np
 from datetime import datetime, timedelta, timezone
 from collections import Counter
-from dotenv import load_dotenv
-from supabase import create_client
+import clients
+import metrics
+from rate_limiter import TokenBucket, parse_retry_after
+import response_cache
+from streaming_stats import RunningStats, KLLSketch, TopKCounter
+import supabase_bulk
+import dedupe
+import entity_index
+import item_records
 
 # ===============================
 # ① .envの読み込みと設定
 # ===============================
-load_dotenv()
+clients.load_env()
 
 EBAY_ACCESS_TOKEN = os.getenv("EBAY_ACCESS_TOKEN")
 MARKETPLACE_ID = os.getenv("EBAY_MARKETPLACE_ID", "EBAY_US")
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-
-# Supabaseクライアント作成
-supabase = None
-if SUPABASE_URL and SUPABASE_KEY:
-    supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+FETCH_CONCURRENCY = int(os.getenv("EBAY_FETCH_CONCURRENCY", "1"))  # 2以上で並列取得モード
+FETCH_RATE = float(os.getenv("EBAY_FETCH_RATE", "5"))  # 1秒あたりの最大リクエスト数
+STREAMING = os.getenv("ANALYZE_STREAMING", "0") == "1"  # 1ならページ単位のストリーミング集計
+KEYWORD_CAPACITY = int(os.getenv("KEYWORD_CAPACITY", "5000"))  # ストリーミング時に保持するキーワード数の上限
+ARCHIVE = os.getenv("SALES_ARCHIVE", "0") == "1"  # 1ならフィルタ後のアイテムをParquetに保存
+KEYWORD_INDEX = os.getenv("KEYWORD_INDEX", "0") == "1"  # 1ならタイトルの単語→価格の転置インデックスに追記
+ITEM_ROWS = os.getenv("SUPABASE_ITEM_ROWS", "0") == "1"  # 1ならアイテム単位の行もSupabaseに保存
+PAGE_DELAY = float(os.getenv("EBAY_PAGE_DELAY", "1"))  # 逐次取得時のページ間の待ち秒数
+WINDOW_END = os.getenv("EBAY_WINDOW_END")  # 期間の終了を固定する場合のみ（例: 2026-10-12T00:00:00Z）
+ENTITY_REPORT_TOP = int(os.getenv("ENTITY_REPORT_TOP", "15"))  # 種別ごとに表示するエンティティ数
+ENTITY_STORE_TOP = int(os.getenv("ENTITY_STORE_TOP", "0"))  # 追跡キャラに加えてtop_charactersに保存するキャラ数（件数の多い順）
+KEYWORD_TOKENIZER = os.getenv("KEYWORD_TOKENIZER", "clean")  # clean: 記号を除いて空白で分割 / entity: エンティティ判定と同じ単語分割
 
 # ===============================
 # ② 検索期間設定（過去90日）
 # ===============================
-end_date = datetime.now(timezone.utc)
-start_date = end_date - timedelta(days=90)
-start_str = start_date.strftime("%Y-%m-%dT%H:%M:%SZ")
-end_str = end_date.strftime("%Y-%m-%dT%H:%M:%SZ")
+WINDOW_DAYS = 90
+
+
+def default_window(days=WINDOW_DAYS):
+    """実行時点から過去days日の期間（import時ではなく呼び出し時に計算）"""
+    if WINDOW_END:
+        end = datetime.strptime(WINDOW_END, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+    else:
+        # 同じ時間帯の再実行ではレスポンスキャッシュが効くよう、終了時刻は正時に切り捨てる
+        end = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    return end - timedelta(days=days), end
 
 # ===============================
 # ③ eBay APIの共通設定
 # ===============================
-BASE_URL = "https://api.ebay.com/buy/browse/v1/item_summary/search"
-COMMON_FILTER = f"itemLocationCountry:JP,soldDate:[{start_str}..{end_str}],price:[1..20000],buyingOptions:FIXED_PRICE"
+BASE_URL = os.getenv("EBAY_BROWSE_URL", "https://api.ebay.com/buy/browse/v1/item_summary/search")  # browse_stub.pyで差し替え可
+PRICE_MIN, PRICE_MAX = 1, 20000
+
+
+def build_filter(start, end, price_min=PRICE_MIN, price_max=PRICE_MAX):
+    """期間と価格帯を指定してBrowse APIのfilter文字列を作成"""
+    start_s = start.strftime("%Y-%m-%dT%H:%M:%SZ")
+    end_s = end.strftime("%Y-%m-%dT%H:%M:%SZ")
+    return f"itemLocationCountry:JP,soldDate:[{start_s}..{end_s}],price:[{price_min}..{price_max}],buyingOptions:FIXED_PRICE"
+
+
+def default_filter():
+    return build_filter(*default_window())
+
+
 HEADERS = {
     "Authorization": f"Bearer {EBAY_ACCESS_TOKEN}",
     "Content-Type": "application/json",
@@ -45,149 +77,444 @@ HEADERS = {
 # ===============================
 # ④ ページネーションで販売データ取得
 # ===============================
-def fetch_all_items(category_id="183454", limit=100, max_pages=10):
+def _page_params(category_id, limit, offset, filter_str, query=None):
+    params = {
+        "category_ids": category_id,
+        "filter": filter_str,
+        "limit": str(limit),
+        "offset": str(offset)
+    }
+    if query:
+        params["q"] = query  # キャラ名などでカテゴリ内を絞り込む場合のみ
+    return params
+
+
+def fetch_all_items(category_id="183454", limit=100, max_pages=10, concurrency=None, filter_str=None, query=None):
+    concurrency = FETCH_CONCURRENCY if concurrency is None else concurrency
+    filter_str = filter_str or default_filter()
+    if concurrency > 1:
+        return asyncio.run(fetch_all_items_async(category_id, limit, max_pages, concurrency, filter_str=filter_str, query=query))
+
     all_items = []
+    for items in iter_pages(category_id, limit, max_pages, filter_str, query):
+        all_items.extend(items)
+
+    print(f"✅ 総取得件数: {len(all_items)} 件")
+    return all_items
+
+
+def iter_pages(category_id="183454", limit=100, max_pages=10, filter_str=None, query=None):
+    """1ページずつ取得して順にyieldする（全件をメモリに溜めない）"""
+    filter_str = filter_str or default_filter()
+    session = clients.get_http_session()
     offset = 0
 
     for page in range(max_pages):
-        params = {
-            "category_ids": category_id,
-            "filter": COMMON_FILTER,
-            "limit": str(limit),
-            "offset": str(offset)
-        }
+        params = _page_params(category_id, limit, offset, filter_str, query)
 
         print(f"📦 ページ {page + 1} を取得中... (offset={offset})")
-        res = requests.get(BASE_URL, headers=HEADERS, params=params)
+        res = response_cache.cached_get(BASE_URL, headers=HEADERS, params=params, session=session)
 
         if res.status_code != 200:
             print("⚠️ APIエラー:", res.text)
             break
 
-        data = res.json()
-        items = data.get("itemSummaries", [])
+        # 必要な項目だけをレコードに取り出し、元のJSONはすぐ捨てる
+        items, _ = item_records.decode_page(res.content)
         if not items:
             print("🔚 データ取得終了。")
             break
 
-        all_items.extend(items)
+        metrics.inc("ebay_items_total", len(items))
+        yield items
         offset += limit
-        time.sleep(1)
+        if not isinstance(res, response_cache.CachedResponse):
+            time.sleep(PAGE_DELAY)
 
         if len(items) < limit:
             break
 
+# ===============================
+# ④-2 並列ページ取得（asyncio）
+# ===============================
+async def _fetch_page_async(session, bucket, params, max_retries=5):
+    """トークンバケットで流量を抑えつつ1ページ取得（429はRetry-Afterに従って再試行）"""
+    cached = response_cache.lookup(BASE_URL, params, HEADERS)
+    if cached is not None:
+        return cached
+
+    for attempt in range(max_retries + 1):
+        await bucket.acquire_async()
+        res = await asyncio.to_thread(response_cache.cached_get, BASE_URL, HEADERS, params, session)
+        if res.status_code != 429:
+            if res.status_code == 200:
+                bucket.on_success()
+            return res
+        retry_after = parse_retry_after(res.headers.get("Retry-After"))
+        metrics.inc("ebay_retries_total")
+        print(f"⏳ レート制限(429) offset={params['offset']} 再試行 {attempt + 1}/{max_retries}")
+        bucket.on_throttle(retry_after)
+    return res
+
+
+async def fetch_all_items_async(category_id="183454", limit=100, max_pages=10, concurrency=4, rate=None, filter_str=None, query=None):
+    """offsetが事前に決まるため、2ページ目以降を並列取得してoffset順に再結合する"""
+    bucket = TokenBucket(rate=rate or FETCH_RATE, capacity=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    session = clients.get_http_session()
+    filter_str = filter_str or default_filter()
+
+    async def fetch(page):
+        async with semaphore:
+            print(f"📦 ページ {page + 1} を取得中... (offset={page * limit})")
+            return await _fetch_page_async(session, bucket, _page_params(category_id, limit, page * limit, filter_str, query))
+
+    async def fetch_decoded(page):
+        # 取得したページはすぐにレコードへ変換し、応答本文を保持しない
+        res = await fetch(page)
+        if res.status_code != 200:
+            return res, None, None
+        items, total = item_records.decode_page(res.content)
+        return res, items, total
+
+    # 1ページ目で総件数を確認し、不要なページはリクエストしない
+    first = await fetch_decoded(0)
+    pages_decoded = [first]
+    res, _, total = first
+    if res.status_code == 200 and max_pages > 1:
+        pages = max_pages if total is None else min(max_pages, -(-int(total) // limit))
+        pages_decoded += await asyncio.gather(*(fetch_decoded(page) for page in range(1, pages)))
+
+    # 逐次版と同じ打ち切り条件でoffset順に結合
+    all_items = []
+    for res, items, _ in pages_decoded:
+        if res.status_code != 200:
+            print("⚠️ APIエラー:", res.text)
+            break
+
+        if not items:
+            print("🔚 データ取得終了。")
+            break
+
+        all_items.extend(items)
+        if len(items) < limit:
+            break
+
+    metrics.inc("ebay_items_total", len(all_items))
     print(f"✅ 総取得件数: {len(all_items)} 件")
     return all_items
 
 # ===============================
 # ⑤ Supabaseに保存
 # ===============================
-def save_sales_data(category, total, avg, median, min_price, top_keywords, top_characters):
-    """Supabaseに分析結果を保存"""
+# price_sketch / character_sketches はKLLスケッチ（streaming_stats.KLLSketch.to_dict）。
+# 複数回分を price_rollup.py で合算すると、再取得なしで期間全体の分位点・ヒストグラムが出せる。
+#   sales_data テーブルの追加列: max_price double precision, price_sketch jsonb, character_sketches jsonb,
+#     run_at timestamptz（同じ日に複数回実行するスケジューラー用。dateだけでは順序が決まらない）
+def save_sales_data(category, total, avg, median, min_price, top_keywords, top_characters,
+                    max_price=None, price_sketch=None, character_sketches=None):
+    """Supabaseに分析結果を保存（保存した行を返す）"""
+    data = {
+        "date": datetime.now().strftime("%Y-%m-%d"),
+        "run_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "category": category,
+        "total_sales": total,
+        "avg_price": avg,
+        "median_price": median,
+        "min_price": min_price,
+        "max_price": max_price,
+        "top_keywords": top_keywords,
+        "top_characters": top_characters,
+        "price_sketch": price_sketch,
+        "character_sketches": character_sketches,
+    }
+    supabase = clients.get_supabase(optional=True)
     if not supabase:
         print("⚠️ Supabase接続情報が設定されていません。.envを確認してください。")
-        return
+        return data
 
     try:
-        data = {
-            "date": datetime.now().strftime("%Y-%m-%d"),
-            "category": category,
-            "total_sales": total,
-            "avg_price": avg,
-            "median_price": median,
-            "min_price": min_price,
-            "top_keywords": top_keywords,
-            "top_characters": top_characters
-        }
-        supabase.table("sales_data").insert(data).execute()
+        with metrics.timer("supabase_write_seconds", table="sales_data"):
+            supabase.table("sales_data").insert(data).execute()
+        metrics.inc("supabase_rows_total", table="sales_data")
         print("✅ Supabaseへ保存完了！")
     except Exception as e:
         print(f"⚠️ Supabase保存エラー: {e}")
+    return data
 
 # ===============================
 # ⑥ データ分析処理
 # ===============================
-def analyze_items(items):
-    exclude_keywords = [
-        "yugioh", "one piece", "weiss", "digimon",
-        "dragon ball", "vanguard", "magic the gathering"
-    ]
+EXCLUDE_KEYWORDS = [
+    "yugioh", "one piece", "weiss", "digimon",
+    "dragon ball", "vanguard", "magic the gathering"
+]
+IGNORE_WORDS = {
+    "pokemon", "card", "japan", "tcg", "game",
+    "rare", "set", "promo", "new", "used",
+    "sealed", "edition", "japanese"
+}
+# top_charactersに毎回保存するキャラ（該当なしの回も0件として残し、週ごとの系列を揃える）
+TRACKED_CHARACTERS = [
+    s.strip().lower()
+    for s in os.getenv("TRACKED_CHARACTERS", "charizard,pikachu,mewtwo,eevee,gengar,lugia,rayquaza,snorlax").split(",")
+    if s.strip()
+]
+# キャラ・弾・レアリティ・鑑定グレードはentities.jsonの辞書で判定する（entity_index.py）
+ENTITIES = entity_index.load()
+ENTITY_KINDS = {"pokemon": "🐉 キャラ別", "set": "📦 弾別", "rarity": "💎 レアリティ別", "grade": "🏅 鑑定グレード別"}
+
+
+def compile_matcher(words):
+    """複数キーワードを1つの正規表現（長い順の選択）にまとめて1回の走査で判定する"""
+    return re.compile("|".join(re.escape(w) for w in sorted(words, key=len, reverse=True)))
+
+
+EXCLUDE_RE = compile_matcher(EXCLUDE_KEYWORDS)
+CLEAN_RE = re.compile(r"[^a-zA-Z0-9\s]")
+
+
+def configure(marketplace=None, exclude_keywords=None):
+    """マーケットプレイスと除外キーワードを切り替える（プロセス単位の設定）"""
+    global EXCLUDE_RE
+    if marketplace:
+        HEADERS["X-EBAY-C-MARKETPLACE-ID"] = marketplace
+    if exclude_keywords is not None:
+        # 空リストは何にもマッチしない正規表現にする
+        EXCLUDE_RE = compile_matcher(exclude_keywords) if exclude_keywords else re.compile(r"(?!)")
+
+
+def scan_item(item):
+    """除外判定・エンティティ判定・キーワード抽出を1回の走査で行う（itemはItemRecord。除外ならNone）"""
+    title = item.title.lower()
+    if EXCLUDE_RE.search(title) or not ("japan" in title or "japan" in item.seller.lower()):
+        return None
+
+    price = item.price
+    tokens = entity_index.tokenize(title)
+    codes = ENTITIES.tag_tokens(tokens)
+    words = []
+    if PRICE_MIN <= price <= PRICE_MAX:
+        # 既定は従来どおりの分割（top_keywordsの過去の週と比べられるように）
+        source = tokens if KEYWORD_TOKENIZER == "entity" else CLEAN_RE.sub("", title).split()
+        words = [w for w in source if len(w) > 2 and w not in IGNORE_WORDS]
+    return price, codes, words
+
+
+@metrics.profiled("analyze")
+def analyze_items(items, category_id="183454", category_label="ポケモンカード"):
+    started = time.perf_counter()
+    items = item_records.as_records(items)
+    if dedupe.DEDUPE_LISTINGS:
+        # 同じ出品者の似たタイトル・同価格の出品は1件として数える
+        items, _ = dedupe.collapse(items)
+    prices = []
+    kept = []
+    entity_codes, entity_cols = [], []
+    counter = Counter()
 
-    filtered = []
     for item in items:
-        title = item.get("title", "").lower()
-        seller = item.get("seller", {}).get("username", "").lower()
-        if (not any(ex in title for ex in exclude_keywords)) and ("japan" in seller or "japan" in title):
-            filtered.append(item)
+        scanned = scan_item(item)
+        if scanned is None:
+            continue
+        price, codes, words = scanned
+        col = len(prices)
+        prices.append(price)
+        kept.append(item)
+        for code in codes:
+            entity_codes.append(code)
+            entity_cols.append(col)
+        counter.update(words)
+
+    scanned_at = time.perf_counter()
+    metrics.observe("analysis_seconds", scanned_at - started, stage="scan")
+    metrics.inc("analysis_items_total", len(items))
+    print(f"📊 フィルタ後の有効データ数: {len(prices)} 件")
+    if ARCHIVE:
+        import sales_archive  # pyarrowは使うときだけ読み込む
+        sales_archive.write_run(kept, category_id)
+    if KEYWORD_INDEX:
+        import keyword_index
+        try:
+            keyword_index.index_run(kept, category_id)
+        except Exception as e:
+            # 索引は補助的なものなので、失敗しても集計と保存は続ける
+            print(f"⚠️ キーワード索引の追記エラー: {e}")
+    if ITEM_ROWS and clients.get_supabase(optional=True):
+        supabase_bulk.bulk_upsert(clients.get_supabase(), supabase_bulk.to_item_rows(kept, category_id))
+
+    prices = np.array(prices, dtype=float)
+    parsed = ~np.isnan(prices)
+    valid = parsed & (prices >= PRICE_MIN) & (prices <= PRICE_MAX)
+    if not valid.any():
+        print("⚠️ 有効な販売データなし。")
+        return
+
+    valid_prices = prices[valid]
 
-    print(f"📊 フィルタ後の有効データ数: {len(filtered)} 件")
+    # エンティティ別の集計は(番号, 価格)の組をまとめてソートして行う（登録数ではなく出現数に比例）
+    entity_codes = np.array(entity_codes, dtype=np.int64)
+    entity_prices = prices[np.array(entity_cols, dtype=np.int64)]
+    hit = ~np.isnan(entity_prices)
+    entity_codes, entity_prices = entity_codes[hit], entity_prices[hit]
+    entity_stats = ENTITIES.summarize(entity_codes, entity_prices)
+    finished = time.perf_counter()
+    metrics.observe("analysis_seconds", finished - scanned_at, stage="stats")
+    metrics.rate("analysis_items_per_second", len(items), finished - started, stage="analyze")
 
-    prices, titles = [], []
-    for item in filtered:
+    return report_and_save(
+        category_label=category_label,
+        total=len(prices),
+        avg_price=float(np.mean(valid_prices)),
+        median_price=float(np.median(valid_prices)),
+        min_price=float(np.min(valid_prices)),
+        max_price=float(np.max(valid_prices)),
+        top_keywords=counter.most_common(15),
+        entity_stats=entity_stats,
+        price_sketch=build_sketch(valid_prices),
+        character_sketch=lambda name: build_sketch(entity_prices[entity_codes == ENTITIES.codes[name]]),
+    )
+
+
+@metrics.profiled("analyze")
+def analyze_items_stream(pages, category_id="183454", category_label="ポケモンカード"):
+    """ページ単位のストリームを集計する（件数に関わらずメモリ使用量は一定）"""
+    overall = RunningStats()
+    sketch = KLLSketch()
+    keywords = TopKCounter(capacity=KEYWORD_CAPACITY)
+    entities = entity_index.StreamingEntityStats(ENTITIES)
+    archive = None
+    if ARCHIVE:
+        import sales_archive  # pyarrowは使うときだけ読み込む
+        archive = sales_archive.RunArchive(category_id)
+    index_writer = None
+    if KEYWORD_INDEX:
+        import keyword_index
         try:
-            price = float(item["price"]["value"])
-            if 1 <= price <= 20000:
-                prices.append(price)
-                titles.append(item.get("title", "").lower())
-        except:
-            continue
+            index_writer = keyword_index.IndexWriter(category_id)
+        except Exception as e:
+            print(f"⚠️ キーワード索引の追記エラー: {e}")
+    supabase = clients.get_supabase(optional=True) if ITEM_ROWS else None
+    # 重複出品の索引はページをまたいで保持する（代表の出品数に比例してメモリを使う）
+    deduper = dedupe.Deduper() if dedupe.DEDUPE_LISTINGS else None
+    total = seen = 0
+    busy = 0.0  # ページ取得の待ち時間を除いた集計時間
+
+    for page in pages:
+        page_started = time.perf_counter()
+        page = item_records.as_records(page)
+        if deduper:
+            page = deduper.filter(page)
+        seen += len(page)
+        kept = []
+        for item in page:
+            scanned = scan_item(item)
+            if scanned is None:
+                continue
+            price, codes, words = scanned
+            total += 1
+            kept.append(item)
+            if np.isnan(price):
+                continue
+            entities.update(codes, price)
+            if PRICE_MIN <= price <= PRICE_MAX:
+                overall.update(price)
+                sketch.update(price)
+                keywords.update(words)
+        entities.flush()
+        busy += time.perf_counter() - page_started
+        if archive:
+            archive.write(kept)
+        if index_writer:
+            try:
+                index_writer.add_items(kept)
+            except Exception as e:
+                # 索引は補助的なものなので、以降のページは索引せずに集計と保存を続ける
+                print(f"⚠️ キーワード索引の追記エラー: {e}")
+                index_writer.abort()
+                index_writer = None
+        if supabase:
+            supabase_bulk.bulk_upsert(supabase, supabase_bulk.to_item_rows(kept, category_id))
 
-    if not prices:
+    if archive:
+        archive.close()
+    if index_writer:
+        try:
+            index_writer.close()
+        except Exception as e:
+            print(f"⚠️ キーワード索引の追記エラー: {e}")
+    if deduper:
+        deduper.report()
+    metrics.observe("analysis_seconds", busy, stage="stream")
+    metrics.inc("analysis_items_total", seen)
+    metrics.rate("analysis_items_per_second", seen, busy, stage="stream")
+    print(f"📊 フィルタ後の有効データ数: {total} 件")
+
+    if overall.count == 0:
         print("⚠️ 有効な販売データなし。")
         return
 
-    avg_price = np.mean(prices)
-    median_price = np.median(prices)
-    min_price = np.min(prices)
-    max_price = np.max(prices)
+    return report_and_save(
+        category_label=category_label,
+        total=total,
+        avg_price=overall.mean,
+        median_price=float(sketch.quantile(0.5)),
+        min_price=overall.min,
+        max_price=overall.max,
+        top_keywords=keywords.most_common(15),
+        entity_stats=entities.summarize(),
+        price_sketch=sketch,
+        character_sketch=entities.sketch,
+    )
+
+
+def build_sketch(values):
+    """価格の配列をKLLスケッチにまとめる（保存・合算用）"""
+    sketch = KLLSketch()
+    sketch.update_many(np.asarray(values, dtype=float).tolist())
+    return sketch
 
+
+def report_and_save(category_label, total, avg_price, median_price, min_price, max_price, top_keywords, entity_stats,
+                    price_sketch=None, character_sketch=None):
+    """集計結果を表示してSupabaseに保存"""
     print("\n📈 価格統計（sort解除・自然順）")
     print(f"平均価格: ${avg_price:.2f}")
     print(f"中央値: ${median_price:.2f}")
     print(f"最低: ${min_price:.2f}, 最高: ${max_price:.2f}")
 
-    ignore_words = [
-        "pokemon", "card", "japan", "tcg", "game",
-        "rare", "set", "promo", "new", "used",
-        "sealed", "edition", "japanese"
-    ]
-    words = []
-    for title in titles:
-        clean = re.sub(r"[^a-zA-Z0-9\s]", "", title)
-        for w in clean.split():
-            if len(w) > 2 and w not in ignore_words:
-                words.append(w.lower())
-
-    counter = Counter(words)
     print("\n🔥 売れ筋キーワードTOP15")
-    for word, count in counter.most_common(15):
+    for word, count in top_keywords:
         print(f"- {word.title()} : {count}件")
 
-    targets = ["charizard", "pikachu", "mewtwo", "eevee", "gengar", "lugia", "rayquaza", "snorlax"]
-    print("\n🐉 特定カード別の販売傾向")
-    top_characters = {}
-    for name in targets:
-        related = [
-            float(item["price"]["value"])
-            for item in filtered if re.search(name, item.get("title", "").lower())
-        ]
-        if related:
-            avg_val = float(np.mean(related))
-            print(f"{name.title()} : {len(related)}件, 平均 ${avg_val:.2f}")
-            top_characters[name] = {"count": len(related), "avg": avg_val}
-        else:
-            print(f"{name.title()} : 該当なし")
-            top_characters[name] = {"count": 0, "avg": 0}
+    for kind, label in ENTITY_KINDS.items():
+        print(f"\n{label}の販売傾向TOP{ENTITY_REPORT_TOP}")
+        rows = entity_index.top_by_kind(ENTITIES, entity_stats, kind, ENTITY_REPORT_TOP)
+        if not rows:
+            print("該当なし")
+        for name, s in rows:
+            print(f"- {name.title()} : {s['count']}件, 平均 ${s['avg']:.2f}, 中央値 ${s['median']:.2f}"
+                  f"（p10 ${s['p10']:.2f} 〜 p90 ${s['p90']:.2f}）")
+
+    # 保存するのはキャラ（pokemon）のみ。追跡キャラは該当なしでも0件で残し、ENTITY_STORE_TOP件を追加する
+    top_characters = {name: entity_stats.get(name) or {"count": 0, "avg": 0} for name in TRACKED_CHARACTERS}
+    for name, stats in entity_index.top_by_kind(ENTITIES, entity_stats, "pokemon", ENTITY_STORE_TOP):
+        top_characters.setdefault(name, stats)
 
     # Supabaseに保存
-    save_sales_data(
-        category="ポケモンカード",
-        total=len(filtered),
+    return save_sales_data(
+        category=category_label,
+        total=total,
         avg=float(avg_price),
         median=float(median_price),
-        top_keywords=dict(counter.most_common(15)),
-        top_characters=top_characters
+        min_price=float(min_price),
+        top_keywords=dict(top_keywords),
+        top_characters=top_characters,
+        max_price=float(max_price),
+        price_sketch=price_sketch.to_dict() if price_sketch else None,
+        character_sketches={
+            name: character_sketch(name).to_dict() for name, stats in top_characters.items() if stats["count"]
+        } if character_sketch else None,
     )
 
 # ===============================
@@ -195,5 +522,9 @@ def analyze_items(items):
 # ===============================
 if __name__ == "__main__":
     print("🌍 eBay ポケモンカード市場分析（sort解除＋Supabase保存対応）")
-    items = fetch_all_items(limit=100, max_pages=10)
-    analyze_items(items)
+    if STREAMING:
+        analyze_items_stream(iter_pages(limit=100, max_pages=10))
+    else:
+        items = fetch_all_items(limit=100, max_pages=10)
+        analyze_items(items)
+    metrics.flush()
@@ -0,0 +1,334 @@
+import os
+import time
+import sqlite3
+import argparse
+from array import array
+from datetime import datetime
+
+import numpy as np
+
+import item_records
+from entity_index import tokenize
+
+# ===============================
+# ① 転置インデックスの設定
+# ===============================
+# 実行ごとにタイトルの単語 → 出品番号（doc id）の転置インデックスを追記し、
+# 「vmax と psa を含むカードの過去半年の価格」のような問い合わせを再取得なしで答える。
+#   runs     : 実行（日時・カテゴリ・取り込み元）
+#   blocks   : doc idの連続範囲ごとの価格配列（float64）
+#   postings : 単語ごとのdoc id列（差分＋可変長整数で圧縮）。書き込みのたびにセグメントが増え、
+#              1単語あたりKEYWORD_INDEX_MAX_SEGMENTSを超えたら1つにまとめる
+KEYWORD_INDEX_DB = os.getenv("KEYWORD_INDEX_DB", "keyword_index.sqlite3")
+KEYWORD_INDEX_FLUSH_DOCS = int(os.getenv("KEYWORD_INDEX_FLUSH_DOCS", "200000"))  # この件数ごとにディスクへ書き出す
+KEYWORD_INDEX_MAX_SEGMENTS = int(os.getenv("KEYWORD_INDEX_MAX_SEGMENTS", "8"))
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS runs (
+        run INTEGER PRIMARY KEY,
+        run_at TEXT NOT NULL,
+        category TEXT NOT NULL,
+        source TEXT UNIQUE
+    );
+    CREATE TABLE IF NOT EXISTS blocks (
+        first_doc INTEGER PRIMARY KEY,
+        docs INTEGER NOT NULL,
+        run INTEGER NOT NULL,
+        prices BLOB NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS postings (
+        token TEXT NOT NULL,
+        first_doc INTEGER NOT NULL,
+        docs INTEGER NOT NULL,
+        data BLOB NOT NULL,
+        PRIMARY KEY (token, first_doc)
+    ) WITHOUT ROWID;
+"""
+
+
+# ===============================
+# ② 可変長整数（7bit単位）による圧縮
+# ===============================
+def encode(doc_ids):
+    """昇順のdoc idを差分にし、7bitずつの可変長整数のバイト列にする（上位ビットが1なら続きあり）"""
+    values = np.diff(np.asarray(doc_ids, dtype=np.int64), prepend=0).astype(np.uint64)
+    if not len(values):
+        return b""
+    lengths = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 10):
+        more = (values >> np.uint64(7 * k)) != 0
+        if not more.any():
+            break
+        lengths += more
+    width = int(lengths.max())
+    out = np.empty((len(values), width), dtype=np.uint8)
+    for k in range(width):
+        out[:, k] = ((values >> np.uint64(7 * k)) & np.uint64(0x7F)) | ((k < lengths - 1) * 0x80).astype(np.uint64)
+    return out[np.arange(width) < lengths[:, None]].tobytes()
+
+
+def decode(data):
+    """encodeの逆。doc idの配列（int64）を返す"""
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if not len(raw):
+        return np.empty(0, dtype=np.int64)
+    if raw.max() < 0x80:
+        # 差分がすべて127以下（頻出語）なら1バイト1件
+        return np.cumsum(raw, dtype=np.int64)
+    ends = np.flatnonzero(raw < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    shifts = (np.arange(len(raw)) - np.repeat(starts, ends - starts + 1)) * 7
+    parts = (raw & 0x7F).astype(np.int64) << shifts
+    return np.cumsum(np.add.reduceat(parts, starts))
+
+
+# ===============================
+# ③ 書き込み（実行単位・一定件数ごとにセグメントを追加）
+# ===============================
+def connect(path=None):
+    conn = sqlite3.connect(path or KEYWORD_INDEX_DB)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+class IndexWriter:
+    """1回の実行分のタイトルと価格を索引に追記する（ページ単位で書ける）"""
+
+    def __init__(self, category_id, run_at=None, path=None, source=None):
+        self.conn = connect(path)
+        run_at = run_at or datetime.now()
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO runs (run_at, category, source) VALUES (?, ?, ?)",
+                (run_at.isoformat(timespec="seconds"), str(category_id), source),
+            )
+        self.run = cursor.lastrowid
+        self.docs = 0
+        self._reset()
+
+    def _reset(self):
+        # doc idはこの書き出し分の中での番号。通し番号への変換はflushで行う
+        self.prices = array("d")
+        self.postings = {}
+
+    def add(self, titles_prices):
+        """(タイトル, 価格)の組を追加（価格が数値でないものは飛ばす）"""
+        for title, price in titles_prices:
+            if price is None or price != price:
+                continue
+            local = len(self.prices)
+            self.prices.append(price)
+            for token in set(tokenize(title)):
+                docs = self.postings.get(token)
+                if docs is None:
+                    self.postings[token] = array("q", (local,))
+                else:
+                    docs.append(local)
+            if len(self.prices) >= KEYWORD_INDEX_FLUSH_DOCS:
+                self.flush()
+
+    def add_items(self, items):
+        self.add((item.title, item.price) for item in item_records.as_records(items))
+
+    def flush(self):
+        if not self.prices:
+            return
+        with self.conn:
+            # 同時に書く別の実行と番号が重ならないよう、先頭番号の読み取りから挿入までを1つの書き込みロックで行う
+            self.conn.execute("BEGIN IMMEDIATE")
+            first = self.conn.execute("SELECT COALESCE(MAX(first_doc + docs), 0) FROM blocks").fetchone()[0]
+            rows = [
+                (token, first + docs[0], len(docs), encode(np.frombuffer(docs, dtype=np.int64) + first))
+                for token, docs in self.postings.items()
+            ]
+            self.conn.execute(
+                "INSERT INTO blocks (first_doc, docs, run, prices) VALUES (?, ?, ?, ?)",
+                (first, len(self.prices), self.run, self.prices.tobytes()),
+            )
+            self.conn.executemany("INSERT INTO postings (token, first_doc, docs, data) VALUES (?, ?, ?, ?)", rows)
+        self.docs += len(self.prices)
+        self._reset()
+
+    def close(self):
+        try:
+            self.flush()
+            merged = merge(self.conn)
+        finally:
+            self.conn.close()
+        print(f"🔎 キーワード索引に追記: {self.docs} 件（セグメント統合 {merged} 語）")
+
+    def abort(self):
+        """書き出していない分を捨てて閉じる（書き出し済みのセグメントは残る）"""
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type:
+            self.abort()
+        else:
+            self.close()
+
+
+def index_run(items, category_id, run_at=None, path=None):
+    with IndexWriter(category_id, run_at, path) as writer:
+        writer.add_items(items)
+    return writer.docs
+
+
+def merge(conn, max_segments=None):
+    """セグメント数が上限を超えた単語のdoc id列を1つにまとめ、まとめた単語数を返す"""
+    max_segments = KEYWORD_INDEX_MAX_SEGMENTS if max_segments is None else max_segments
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        tokens = [row[0] for row in conn.execute(
+            "SELECT token FROM postings GROUP BY token HAVING COUNT(*) > ?", (max_segments,)
+        )]
+        for token in tokens:
+            rows = conn.execute("SELECT data FROM postings WHERE token = ? ORDER BY first_doc", (token,)).fetchall()
+            docs = np.concatenate([decode(data) for data, in rows])
+            conn.execute("DELETE FROM postings WHERE token = ?", (token,))
+            conn.execute(
+                "INSERT INTO postings (token, first_doc, docs, data) VALUES (?, ?, ?, ?)",
+                (token, int(docs[0]), len(docs), encode(docs)),
+            )
+    return len(tokens)
+
+
+# ===============================
+# ④ アーカイブ（sales_archive.py）からの取り込み
+# ===============================
+def index_archive(root=None, path=None):
+    """Parquetアーカイブのうち未取り込みのファイルを索引に追加する（ファイル = 1回の実行）"""
+    import pyarrow.parquet as pq
+    import sales_archive
+    root = root or sales_archive.ARCHIVE_DIR
+    conn = connect(path)
+    done = {row[0] for row in conn.execute("SELECT source FROM runs WHERE source IS NOT NULL")}
+    conn.close()
+
+    added = 0
+    for directory, _, files in sorted(os.walk(root)):
+        parts = dict(p.split("=", 1) for p in os.path.relpath(directory, root).split(os.sep) if "=" in p)
+        for name in sorted(files):
+            source = os.path.join(directory, name)
+            if not name.endswith(".parquet") or source in done:
+                continue
+            table = pq.read_table(source, columns=["title", "price"])
+            run_at = datetime.strptime(parts.get("date", "1970-01-01"), "%Y-%m-%d")
+            with IndexWriter(parts.get("category", ""), run_at, path, source=source) as writer:
+                writer.add(zip(table.column("title").to_pylist(), table.column("price").to_pylist()))
+            added += 1
+    return added
+
+
+# ===============================
+# ⑤ 問い合わせ（複数語のAND）
+# ===============================
+class KeywordIndex:
+    """読み取り用。価格配列は初回に読み込み、以降の問い合わせで使い回す"""
+
+    def __init__(self, path=None):
+        self.conn = connect(path)
+        self._load_blocks()
+
+    def _load_blocks(self):
+        rows = self.conn.execute(
+            "SELECT b.first_doc, b.docs, b.prices, r.run, r.run_at, r.category "
+            "FROM blocks b JOIN runs r ON r.run = b.run ORDER BY b.first_doc"
+        ).fetchall()
+        self.block_starts = np.array([r[0] for r in rows], dtype=np.int64)
+        self.block_runs = [(r[3], r[4], r[5]) for r in rows]
+        # doc idは連番なので、価格はdoc id - 先頭の位置で引ける
+        self.base = rows[0][0] if rows else 0
+        self.prices = np.full((rows[-1][0] + rows[-1][1] - self.base) if rows else 0, np.nan)
+        for first_doc, docs, prices, *_ in rows:
+            self.prices[first_doc - self.base:first_doc - self.base + docs] = np.frombuffer(prices, dtype=np.float64)
+
+    def postings(self, token):
+        rows = self.conn.execute("SELECT data FROM postings WHERE token = ? ORDER BY first_doc", (token,)).fetchall()
+        if not rows:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([decode(data) for data, in rows])
+
+    def document_frequency(self, token):
+        return self.conn.execute("SELECT COALESCE(SUM(docs), 0) FROM postings WHERE token = ?", (token,)).fetchone()[0]
+
+    def search(self, query, since=None, until=None, category=None):
+        """queryの全単語を含む出品のdoc idを返す（件数の少ない単語から順に絞り込む）"""
+        tokens = sorted(set(tokenize(query)), key=self.document_frequency)
+        if not tokens:
+            return np.empty(0, dtype=np.int64)
+        docs = self.postings(tokens[0])
+        for token in tokens[1:]:
+            if not len(docs):
+                break
+            docs = np.intersect1d(docs, self.postings(token), assume_unique=True)
+        if len(docs) and (since or until or category):
+            blocks = np.searchsorted(self.block_starts, docs, side="right") - 1
+            allowed = np.array([
+                (not since or run_at[:10] >= since) and (not until or run_at[:10] <= until)
+                and (not category or run_category == str(category))
+                for _, run_at, run_category in self.block_runs
+            ], dtype=bool)
+            docs = docs[allowed[blocks]]
+        return docs
+
+    def query(self, query, since=None, until=None, category=None):
+        """件数・平均・分位点と、該当した実行数を返す"""
+        started = time.perf_counter()
+        docs = self.search(query, since, until, category)
+        prices = self.prices[docs - self.base]
+        prices = prices[~np.isnan(prices)]
+        result = {"query": query, "count": int(len(prices))}
+        if len(prices):
+            runs = np.unique(np.searchsorted(self.block_starts, docs, side="right") - 1)
+            result.update(
+                mean=float(prices.mean()), min=float(prices.min()), max=float(prices.max()),
+                runs=len({self.block_runs[b][0] for b in runs.tolist()}),
+                **{f"p{int(q * 100)}": float(v) for q, v in zip(QUANTILES, np.quantile(prices, QUANTILES))},
+            )
+        result["ms"] = (time.perf_counter() - started) * 1000
+        return result
+
+    def stats(self):
+        runs, = self.conn.execute("SELECT COUNT(*) FROM runs").fetchone()
+        tokens, segments, size = self.conn.execute(
+            "SELECT COUNT(DISTINCT token), COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM postings"
+        ).fetchone()
+        return {"runs": runs, "docs": int((~np.isnan(self.prices)).sum()), "tokens": tokens,
+                "segments": segments, "posting_bytes": size}
+
+
+def print_result(result):
+    print(f"🔎 「{result['query']}」: {result['count']} 件（{result['ms']:.1f} ms）")
+    if result["count"]:
+        print(f"平均 ${result['mean']:.2f} / 中央値 ${result['p50']:.2f} / 最低 ${result['min']:.2f} / 最高 ${result['max']:.2f}")
+        print(f"p10 ${result['p10']:.2f} / p25 ${result['p25']:.2f} / p75 ${result['p75']:.2f} / p90 ${result['p90']:.2f}"
+              f"（{result['runs']} 回の実行から）")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="キーワード転置インデックスの問い合わせ")
+    parser.add_argument("query", nargs="*", help="検索語（複数ならAND。例: vmax psa）")
+    parser.add_argument("--since", help="この日以降の実行のみ（YYYY-MM-DD）")
+    parser.add_argument("--until", help="この日以前の実行のみ（YYYY-MM-DD）")
+    parser.add_argument("--category", help="カテゴリIDで絞り込む")
+    parser.add_argument("--db", help="索引ファイル（既定はKEYWORD_INDEX_DB）")
+    parser.add_argument("--from-archive", action="store_true", help="Parquetアーカイブの未取り込み分を追加してから検索")
+    parser.add_argument("--merge", action="store_true", help="全単語のセグメントを1つにまとめる")
+    args = parser.parse_args()
+
+    if args.from_archive:
+        print(f"🗄 アーカイブから {index_archive(path=args.db)} 回分を取り込みました")
+    if args.merge:
+        conn = connect(args.db)
+        print(f"🧱 {merge(conn, max_segments=1)} 語のセグメントをまとめました")
+        conn.close()
+    index = KeywordIndex(args.db)
+    if not args.query:
+        print("📚 索引の状態:", index.stats())
+    else:
+        print_result(index.query(" ".join(args.query), args.since, args.until, args.category))
@@ -0,0 +1,154 @@
+import os
+import time
+import json
+import sqlite3
+import hashlib
+import threading
+
+import metrics
+
+# ===============================
+# ① キャッシュ設定
+# ===============================
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB", "llm_cache.sqlite3")
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))  # 秒（0なら無効）
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "500"))
+
+_conn = None
+_lock = threading.Lock()
+
+
+def _db():
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(LLM_CACHE_DB, check_same_thread=False)
+        _conn.executescript("""
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                row_ids TEXT NOT NULL,
+                completion TEXT NOT NULL,
+                prompt_tokens INTEGER,
+                completion_tokens INTEGER,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_completions_last_used ON completions (last_used);
+        """)
+    return _conn
+
+
+# ===============================
+# ② キー生成（モデル・正規化プロンプト・入力行ID）
+# ===============================
+def prompt_hash(prompt):
+    """空白や改行の揺れを無視したプロンプトのハッシュ"""
+    normalized = " ".join(prompt.split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def cache_key(model, prompt, row_ids=()):
+    ids = json.dumps(sorted(str(i) for i in row_ids if i is not None))
+    return hashlib.sha256(f"{model}\n{prompt_hash(prompt)}\n{ids}".encode("utf-8")).hexdigest(), ids
+
+
+# ===============================
+# ③ キャッシュ付きChat Completion
+# ===============================
+def lookup(model, prompt, row_ids=(), ttl=None):
+    ttl = LLM_CACHE_TTL if ttl is None else ttl
+    key, _ = cache_key(model, prompt, row_ids)
+    with _lock:
+        db = _db()
+        row = db.execute("SELECT completion, created FROM completions WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        completion, created = row
+        if ttl and time.time() - created > ttl:
+            db.execute("DELETE FROM completions WHERE key = ?", (key,))
+            db.commit()
+            return None
+        db.execute("UPDATE completions SET last_used = ?, hits = hits + 1 WHERE key = ?", (time.time(), key))
+        db.commit()
+    return completion
+
+
+def store(model, prompt, row_ids, completion, usage=None):
+    key, ids = cache_key(model, prompt, row_ids)
+    now = time.time()
+    with _lock:
+        db = _db()
+        db.execute(
+            "INSERT OR REPLACE INTO completions "
+            "(key, model, prompt_hash, row_ids, completion, prompt_tokens, completion_tokens, created, last_used, hits) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0)",
+            (key, model, prompt_hash(prompt), ids, completion,
+             getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None), now, now),
+        )
+        # 件数上限を超えた分は最終利用が古い順に削除（LRU）
+        db.execute(
+            "DELETE FROM completions WHERE key NOT IN "
+            "(SELECT key FROM completions ORDER BY last_used DESC LIMIT ?)",
+            (LLM_CACHE_MAX_ENTRIES,),
+        )
+        db.commit()
+
+
+def _record_usage(model, usage):
+    metrics.inc("llm_calls_total", model=model)
+    if usage is not None:
+        metrics.inc("llm_tokens_total", usage.prompt_tokens or 0, model=model, kind="prompt")
+        metrics.inc("llm_tokens_total", usage.completion_tokens or 0, model=model, kind="completion")
+
+
+def cached_completion(client, model, prompt, row_ids=(), ttl=None):
+    """同じモデル・プロンプト・入力行ならOpenAIを呼ばずに保存済みの回答を返す"""
+    hit = lookup(model, prompt, row_ids, ttl)
+    if hit is not None:
+        metrics.inc("llm_cache_hits_total", model=model)
+        print("♻️ LLMキャッシュを使用しました（トークン消費なし）")
+        return hit
+
+    with metrics.timer("llm_seconds", model=model):
+        response = client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}]
+        )
+    content = response.choices[0].message.content
+    usage = getattr(response, "usage", None)
+    _record_usage(model, usage)
+    store(model, prompt, row_ids, content, usage)
+    if usage is not None:
+        print(f"🧾 トークン使用量: prompt {usage.prompt_tokens} / completion {usage.completion_tokens}")
+    return content
+
+
+async def cached_completion_async(client, model, prompt, row_ids=(), ttl=None):
+    """AsyncOpenAIクライアント用のcached_completion"""
+    hit = lookup(model, prompt, row_ids, ttl)
+    if hit is not None:
+        metrics.inc("llm_cache_hits_total", model=model)
+        return hit
+
+    with metrics.timer("llm_seconds", model=model):
+        response = await client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}]
+        )
+    content = response.choices[0].message.content
+    usage = getattr(response, "usage", None)
+    _record_usage(model, usage)
+    store(model, prompt, row_ids, content, usage)
+    return content
+
+
+def usage_summary():
+    """キャッシュに記録されたトークン使用量とヒット数の合計"""
+    with _lock:
+        row = _db().execute(
+            "SELECT COUNT(*), COALESCE(SUM(prompt_tokens), 0), COALESCE(SUM(completion_tokens), 0), "
+            "COALESCE(SUM(hits), 0), COALESCE(SUM(hits * (prompt_tokens + completion_tokens)), 0) FROM completions"
+        ).fetchone()
+    return dict(zip(["entries", "prompt_tokens", "completion_tokens", "hits", "tokens_saved"], row))
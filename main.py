@@ -1,7 +1,6 @@
 import os
 from datetime import datetime
-from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
+import slack_notify
 
 # ==== 環境変数読み込み ====
 SLACK_BOT_TOKEN = os.getenv("SLACK_TOKEN")
@@ -9,12 +8,7 @@ SLACK_CHANNEL = os.getenv("SLACK_CHANNEL")
 
 # ==== Slack通知関数 ====
 def send_slack_message(message):
-    try:
-        client = WebClient(token=SLACK_BOT_TOKEN)
-        client.chat_postMessage(channel=SLACK_CHANNEL, text=message)
-        print(f"✅ Slack通知成功: {message}")
-    except SlackApiError as e:
-        print(f"⚠️ Slack通知失敗: {e.response['error']}")
+    slack_notify.notify(SLACK_CHANNEL, message)
 
 # ==== メイン処理 ====
 def main():
@@ -1,14 +1,21 @@
 import os
-import requests
+import json
+import time
+import hashlib
 from datetime import datetime
-from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+import clients
+import metrics
+import item_records
+import slack_notify
+import response_cache
+import state_file
+from rate_limiter import TokenBucket, parse_retry_after
 
 # ===============================
 # ① .envファイルを読み込む
 # ===============================
-load_dotenv()
+clients.load_env()
 
 # ===============================
 # ② 環境変数を取得
@@ -18,27 +25,31 @@ SLACK_CHANNEL = os.getenv("SLACK_CHANNEL")
 EBAY_ACCESS_TOKEN = os.getenv("EBAY_ACCESS_TOKEN")  # ← Productionトークン
 MARKETPLACE_ID = os.getenv("EBAY_MARKETPLACE_ID", "EBAY_US")
 SEARCH_QUERY = os.getenv("EBAY_QUERY", "iphone")  # デフォルト検索ワード
+BROWSE_URL = os.getenv("EBAY_BROWSE_URL", "https://api.ebay.com/buy/browse/v1/item_summary/search")
+
+# ウォッチリスト（1行1検索ワード）を指定すると、全件を並列に検索して変化のあった分だけ1通にまとめて通知する
+WATCHLIST_FILE = os.getenv("WATCHLIST_FILE")
+WATCHLIST_STATE = os.getenv("WATCHLIST_STATE", "watchlist_state.json")  # 前回結果のフィンガープリント
+WATCHLIST_CONCURRENCY = int(os.getenv("WATCHLIST_CONCURRENCY", "16"))  # HTTP_POOL_SIZE以下にする
+WATCHLIST_RATE = float(os.getenv("WATCHLIST_RATE", "5"))  # 全検索合計の1秒あたりリクエスト数
+WATCHLIST_LIMIT = int(os.getenv("WATCHLIST_LIMIT", "5"))
+MAX_RETRIES = 5
 
 # ===============================
 # ③ Slack通知関数
 # ===============================
-def send_slack_message(message):
+def send_slack_message(message, wait=False):
+    """wait=Trueなら送信し終えるまで待ち、成功したかを返す"""
     if not SLACK_BOT_TOKEN or not SLACK_CHANNEL:
         print("⚠️ Slackトークンまたはチャンネルが設定されていません。")
-        return
-    try:
-        client = WebClient(token=SLACK_BOT_TOKEN)
-        client.chat_postMessage(channel=SLACK_CHANNEL, text=message)
-        print(f"✅ Slack通知成功: {message[:50]}...")
-    except SlackApiError as e:
-        print(f"⚠️ Slack通知失敗: {e.response['error']}")
+        return False
+    return slack_notify.notify(SLACK_CHANNEL, message, wait=wait)
 
 # ===============================
 # ④ eBay Browse API版データ取得
 # ===============================
-def fetch_ebay_items(query, limit=5):
-    """Browse APIで商品を検索"""
-    url = "https://api.ebay.com/buy/browse/v1/item_summary/search"
+def fetch_ebay_items(query, limit=5, bucket=None):
+    """Browse APIで商品を検索（bucketを渡すと共有のレート制限に従い、429は待って再試行）"""
     headers = {
         "Authorization": f"Bearer {EBAY_ACCESS_TOKEN}",
         "Content-Type": "application/json",
@@ -47,14 +58,22 @@ def fetch_ebay_items(query, limit=5):
     params = {"q": query, "limit": limit}
 
     print(f"🌍 eBay API接続中: {query}")
-    res = requests.get(url, headers=headers, params=params)
-    print("HTTP Status:", res.status_code)
+    for attempt in range(MAX_RETRIES + 1):
+        if bucket:
+            bucket.acquire()
+        res = response_cache.cached_get(BROWSE_URL, headers=headers, params=params, session=clients.get_http_session())
+        if res.status_code != 429 or not bucket or attempt == MAX_RETRIES:
+            break
+        metrics.inc("ebay_retries_total")
+        bucket.on_throttle(parse_retry_after(res.headers.get("Retry-After")))
+    print(f"HTTP Status: {res.status_code} ({query})")
 
     if res.status_code != 200:
         raise Exception(f"APIエラー: {res.status_code} {res.text}")
+    if bucket:
+        bucket.on_success()
 
-    data = res.json()
-    items = data.get("itemSummaries", [])
+    items = item_records.loads(res.content).get("itemSummaries", [])
 
     results = []
     for item in items:
@@ -66,8 +85,99 @@ def fetch_ebay_items(query, limit=5):
     return results
 
 # ===============================
-# ⑤ メイン処理
+# ⑤ ウォッチリスト一括検索
 # ===============================
+def load_watchlist(path=None):
+    """1行1検索ワード（空行と#で始まる行は無視、重複は1つにまとめる）"""
+    with open(path or WATCHLIST_FILE, encoding="utf-8") as f:
+        queries = (line.strip() for line in f)
+        return list(dict.fromkeys(q for q in queries if q and not q.startswith("#")))
+
+
+def fingerprint(items):
+    """検索結果の内容（タイトル・価格・URL）が同じなら同じ値になるハッシュ"""
+    payload = json.dumps(sorted((i["title"] or "", i["price"], i["url"] or "") for i in items), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def load_state(path=None):
+    return state_file.load_json(path or WATCHLIST_STATE)
+
+
+def save_state(state, path=None):
+    state_file.save_json(path or WATCHLIST_STATE, state)
+
+
+def run_watchlist(queries, limit=None, state_path=None, workers=None):
+    """全検索ワードを共有セッション・共有レート制限で並列に検索し、変化のあった結果だけのダイジェストを返す。
+    更新後の状態は保存せずに返す（通知できてから保存する）"""
+    limit = limit or WATCHLIST_LIMIT
+    workers = workers or WATCHLIST_CONCURRENCY
+    started = time.perf_counter()
+    bucket = TokenBucket(rate=WATCHLIST_RATE, capacity=max(1, min(workers, WATCHLIST_RATE)))
+    state = load_state(state_path)
+
+    def search(query):
+        try:
+            return query, fetch_ebay_items(query, limit=limit, bucket=bucket), None
+        except Exception as e:
+            return query, None, e
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(queries)))) as pool:
+        results = list(pool.map(search, queries))
+
+    changed, unchanged, errors = [], 0, []
+    for query, items, error in results:
+        if error is not None:
+            errors.append((query, error))
+            metrics.inc("watchlist_queries_total", status="error")
+            continue
+        digest = fingerprint(items)
+        if state.get(query) == digest:
+            unchanged += 1
+            metrics.inc("watchlist_queries_total", status="unchanged")
+            continue
+        state[query] = digest
+        changed.append((query, items))
+        metrics.inc("watchlist_queries_total", status="changed")
+
+    seconds = time.perf_counter() - started
+    metrics.observe("watchlist_seconds", seconds)
+    lines = [
+        f"🔔 eBayウォッチリスト（{len(queries)} 件 / {seconds:.1f} 秒）",
+        f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+        f"更新あり {len(changed)} 件 / 変化なし {unchanged} 件 / エラー {len(errors)} 件",
+    ]
+    for query, items in changed:
+        lines.append(f"\n🔍 {query}")
+        if not items:
+            lines.append("⚠️ 商品が見つかりませんでした。")
+        for item in items:
+            lines.append(f"- {item['title']} ({item['price']})\n{item['url']}")
+    if errors:
+        lines.append("\n❌ エラー")
+        lines.extend(f"- {query}: {error}" for query, error in errors)
+    return "\n".join(lines), changed, errors, state
+
+
+# ===============================
+# ⑥ メイン処理
+# ===============================
+def main_watchlist():
+    queries = load_watchlist()
+    if not queries:
+        print("⚠️ ウォッチリストが空です。")
+        return
+    message, changed, errors, state = run_watchlist(queries)
+    print(message)
+    # 更新もエラーもなければ通知しない
+    if (changed or errors) and not send_slack_message(message, wait=True):
+        # 通知できなかった変化は既読にせず、次回もう一度通知する
+        print("⚠️ 通知できなかったため、今回の変化は次回も通知します。")
+        return
+    save_state(state)
+
+
 def main():
     send_slack_message(f"🔍 eBayリサーチ開始: {SEARCH_QUERY}")
 
@@ -92,7 +202,10 @@ def main():
         print(f"❌ エラー詳細: {e}")
 
 # ===============================
-# ⑥ 実行
+# ⑦ 実行
 # ===============================
 if __name__ == "__main__":
-    main()
+    if WATCHLIST_FILE:
+        main_watchlist()
+    else:
+        main()
@@ -0,0 +1,238 @@
+import os
+import io
+import time
+import uuid
+import pstats
+import cProfile
+import threading
+import functools
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import clients
+
+# ===============================
+# ① 計測の設定
+# ===============================
+# 各処理にタイマー・カウンターを仕込み、実行の最後にまとめて書き出す。
+#   run_metrics テーブル（Supabase）: 1系列1行
+#     run_id text, run_at timestamptz, name text, kind text, labels jsonb,
+#     value double precision, count bigint, buckets jsonb
+#   Prometheusテキストファイル（node_exporterのtextfile collector用）: METRICS_TEXTFILE
+METRICS_TABLE = os.getenv("METRICS_TABLE", "")  # 空ならテーブルに保存しない（例: run_metrics）
+METRICS_TEXTFILE = os.getenv("METRICS_TEXTFILE", "")  # 例: /var/lib/node_exporter/ebay_research.prom
+PROFILE_STAGES = {s.strip() for s in os.getenv("PROFILE_STAGES", "").split(",") if s.strip()}  # 例: analyze
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)  # 秒
+
+RUN_ID = uuid.uuid4().hex[:12]
+RUN_AT = datetime.now(timezone.utc)
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+# ===============================
+# ② 記録（カウンター・ゲージ・ヒストグラム）
+# ===============================
+def inc(name, value=1, **labels):
+    """カウンターを加算（件数・バイト数・再試行回数・トークン数など）"""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = value
+
+
+def observe(name, seconds, **labels):
+    """所要時間をヒストグラムに記録"""
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [[0] * len(BUCKETS), 0.0, 0]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                hist[0][i] += 1
+        hist[1] += seconds
+        hist[2] += 1
+
+
+def rate(name, items, seconds, **labels):
+    """1秒あたりの件数をゲージとして記録"""
+    if seconds > 0:
+        set_gauge(name, items / seconds, **labels)
+
+
+@contextmanager
+def timer(name, **labels):
+    """with文・デコレーターのどちらでも使える所要時間の計測"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+
+
+def snapshot():
+    """記録済みの全系列を run_metrics テーブルの行形式で返す"""
+    run_at = RUN_AT.isoformat()
+    rows = []
+    with _lock:
+        for (name, labels), value in sorted(_counters.items()):
+            rows.append({"name": name, "kind": "counter", "labels": dict(labels), "value": value, "count": None, "buckets": None})
+        for (name, labels), value in sorted(_gauges.items()):
+            rows.append({"name": name, "kind": "gauge", "labels": dict(labels), "value": value, "count": None, "buckets": None})
+        for (name, labels), (buckets, total, count) in sorted(_histograms.items()):
+            rows.append({"name": name, "kind": "histogram", "labels": dict(labels), "value": total, "count": count,
+                         "buckets": {str(b): c for b, c in zip(BUCKETS, buckets)}})
+    for row in rows:
+        row.update(run_id=RUN_ID, run_at=run_at)
+    return rows
+
+
+def merge(rows):
+    """別プロセスのsnapshot()の結果をこのプロセスの記録に足し込む（ゲージは上書き）"""
+    with _lock:
+        for row in rows:
+            key = _key(row["name"], row["labels"])
+            if row["kind"] == "counter":
+                _counters[key] = _counters.get(key, 0) + row["value"]
+            elif row["kind"] == "gauge":
+                _gauges[key] = row["value"]
+            else:
+                hist = _histograms.get(key)
+                if hist is None:
+                    hist = _histograms[key] = [[0] * len(BUCKETS), 0.0, 0]
+                for i, bound in enumerate(BUCKETS):
+                    hist[0][i] += row["buckets"].get(str(bound), 0)
+                hist[1] += row["value"]
+                hist[2] += row["count"]
+
+
+# ===============================
+# ③ 書き出し（Supabase / Prometheus）
+# ===============================
+def _labels_text(labels, extra=None):
+    pairs = list(labels.items()) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def to_prometheus(rows=None):
+    """Prometheusのテキスト形式に変換"""
+    rows = snapshot() if rows is None else rows
+    lines, typed = [], set()
+    for row in rows:
+        name, labels = row["name"], row["labels"]
+        if name not in typed:
+            lines.append(f"# TYPE {name} {row['kind']}")
+            typed.add(name)
+        if row["kind"] != "histogram":
+            lines.append(f"{name}{_labels_text(labels)} {row['value']}")
+            continue
+        for bound, count in row["buckets"].items():
+            lines.append(f"{name}_bucket{_labels_text(labels, {'le': bound})} {count}")
+        lines.append(f"{name}_bucket{_labels_text(labels, {'le': '+Inf'})} {row['count']}")
+        lines.append(f"{name}_sum{_labels_text(labels)} {row['value']}")
+        lines.append(f"{name}_count{_labels_text(labels)} {row['count']}")
+    lines.append("# TYPE run_timestamp_seconds gauge")
+    lines.append(f"run_timestamp_seconds {RUN_AT.timestamp():.0f}")
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path=None, rows=None):
+    """途中の状態を読まれないよう、一時ファイルに書いてから置き換える"""
+    path = path or METRICS_TEXTFILE
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(to_prometheus(rows))
+    os.replace(tmp, path)
+
+
+def export_table(client=None, table=None, rows=None):
+    table = table or METRICS_TABLE
+    client = client or clients.get_supabase(optional=True)
+    if not client:
+        return 0
+    rows = snapshot() if rows is None else rows
+    try:
+        client.table(table).insert(rows).execute()
+    except Exception as e:
+        print(f"⚠️ 計測結果の保存エラー（{table}）: {e}")
+        return 0
+    return len(rows)
+
+
+def print_summary(rows=None):
+    rows = snapshot() if rows is None else rows
+    print(f"\n📈 計測結果（run_id={RUN_ID}）")
+    for row in rows:
+        labels = ",".join(f"{k}={v}" for k, v in row["labels"].items())
+        label = f"{row['name']}{{{labels}}}" if labels else row["name"]
+        if row["kind"] == "histogram":
+            average = row["value"] / row["count"] if row["count"] else 0
+            print(f"- {label}: {row['count']} 回 / 合計 {row['value']:.2f} 秒 / 平均 {average * 1000:.1f} ms")
+        elif isinstance(row["value"], float):
+            print(f"- {label}: {row['value']:,.1f}")
+        else:
+            print(f"- {label}: {row['value']:,}")
+
+
+def flush():
+    """実行の最後に呼び、計測結果を表示してテーブル・テキストファイルへ書き出す"""
+    rows = snapshot()
+    if not rows:
+        return
+    print_summary(rows)
+    if METRICS_TABLE and export_table(rows=rows):
+        print(f"✅ 計測結果を {METRICS_TABLE} に保存しました（{len(rows)} 系列）")
+    if METRICS_TEXTFILE:
+        write_textfile(rows=rows)
+        print(f"✅ Prometheus用テキストファイルを書き出しました: {METRICS_TEXTFILE}")
+
+
+# ===============================
+# ④ cProfile（PROFILE_STAGESで指定したステージのみ）
+# ===============================
+def profiled(stage):
+    """PROFILE_STAGESに含まれるときだけcProfileで実行し、.profと上位関数を出力するデコレーター"""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if stage not in PROFILE_STAGES:
+                return func(*args, **kwargs)
+            profiler = cProfile.Profile()
+            try:
+                return profiler.runcall(func, *args, **kwargs)
+            finally:
+                os.makedirs(PROFILE_DIR, exist_ok=True)
+                path = os.path.join(PROFILE_DIR, f"{stage}-{RUN_ID}.prof")
+                profiler.dump_stats(path)
+                out = io.StringIO()
+                pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(15)
+                print(f"🔬 プロファイル（{stage}）: {path}\n{out.getvalue()}")
+        return wrapper
+    return decorate
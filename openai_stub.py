@@ -0,0 +1,90 @@
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ===============================
+# ① ローカル用OpenAI互換サーバー
+# ===============================
+# OPENAI_BASE_URL=http://127.0.0.1:8787/v1 を指定すると、
+# chat.completions.create をオフラインで受け付ける（固定の回答を返す）。
+
+
+class OpenAIStub:
+    """受け取ったリクエスト数を数え、指定した遅延の後に決まった回答を返すスタブ"""
+
+    def __init__(self, latency=0.0, reply=None):
+        self.latency = latency
+        self.reply = reply
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def complete(self, body):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        if self.latency:
+            time.sleep(self.latency)
+        prompt = "\n".join(m.get("content", "") for m in body.get("messages", []))
+        content = self.reply or f"（スタブ回答 #{call}）プロンプト {len(prompt)} 文字を受け取りました。"
+        prompt_tokens = max(1, len(prompt) // 4)
+        completion_tokens = max(1, len(content) // 4)
+        return {
+            "id": f"chatcmpl-stub-{call}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+
+def _make_handler(stub):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_response(404)
+                self.end_headers()
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            data = json.dumps(stub.complete(body), ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+def serve(port=8787, latency=0.0, reply=None):
+    """バックグラウンドスレッドでスタブを起動し、(server, stub)を返す"""
+    stub = OpenAIStub(latency=latency, reply=reply)
+    server = ThreadingHTTPServer(("127.0.0.1", port), _make_handler(stub))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stub
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ローカル用OpenAI互換スタブ")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", type=float, default=0.0, help="1回の応答にかける秒数")
+    args = parser.parse_args()
+
+    stub = OpenAIStub(latency=args.latency)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), _make_handler(stub))
+    print(f"🧪 OpenAIスタブ起動: http://127.0.0.1:{args.port}/v1（OPENAI_BASE_URLに指定）")
+    server.serve_forever()
@@ -0,0 +1,135 @@
+import os
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import metrics
+
+# ===============================
+# ① DAG実行エンジン
+# ===============================
+class Pipeline:
+    """依存関係のあるステージを、前提が揃ったものから並列に実行する"""
+
+    def __init__(self):
+        self.stages = {}
+
+    def stage(self, name, deps=()):
+        def register(func):
+            self.stages[name] = (func, tuple(deps))
+            return func
+        return register
+
+    @staticmethod
+    def _timed(name, func, results):
+        started = time.perf_counter()
+        try:
+            value = func(results)
+        finally:
+            metrics.observe("pipeline_stage_seconds", time.perf_counter() - started, stage=name)
+        return value, time.perf_counter() - started
+
+    def run(self, workers=4, skip=()):
+        results, timings, status = {}, {}, {name: "skipped" for name in skip}
+        pending = {name: spec for name, spec in self.stages.items() if name not in skip}
+        running = {}
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while pending or running:
+                for name, (func, deps) in list(pending.items()):
+                    if any(status.get(d) in ("failed", "blocked") for d in deps):
+                        status[name] = "blocked"
+                        del pending[name]
+                    elif all(status.get(d) in ("ok", "skipped") for d in deps):
+                        print(f"▶️ ステージ開始: {name}")
+                        running[pool.submit(self._timed, name, func, results)] = name
+                        del pending[name]
+                if not running:
+                    for name in pending:
+                        status[name] = "blocked"
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name], timings[name] = future.result()
+                        status[name] = "ok"
+                    except Exception as e:
+                        status[name] = "failed"
+                        print(f"❌ ステージ失敗: {name}: {e}")
+
+        self.print_summary(status, timings, time.perf_counter() - started)
+        return results, status
+
+    def print_summary(self, status, timings, total):
+        icons = {"ok": "✅", "failed": "❌", "blocked": "⛔", "skipped": "⏭"}
+        print(f"\n⏱ ステージ別の所要時間（合計 {total:.2f} 秒）")
+        for name in self.stages:
+            seconds = f"{timings[name]:.2f} 秒" if name in timings else "-"
+            print(f"{icons[status.get(name, 'blocked')]} {name:<12} {seconds}")
+
+
+# ===============================
+# ② 週次レポートのステージ定義
+# ===============================
+def build_weekly_pipeline(category_id="183454", limit=100, max_pages=10, category_label=None):
+    # 各モジュールはこのプロセスで1回だけimportし、クライアントはclients.pyで共有する
+    import clients
+    import jp_pokemon_sales_no_sort as sales
+    import trend_engine
+    import trend_report
+    import ai_profitable_items
+    import ai_profitable_items_trend
+
+    # 保存と読み込みで同じカテゴリを使う（既定は週次レポートのWEEKLY_CATEGORY）
+    category_label = category_label or trend_engine.WEEKLY_CATEGORY
+    pipeline = Pipeline()
+
+    @pipeline.stage("crawl")
+    def crawl(results):
+        return sales.fetch_all_items(category_id=category_id, limit=limit, max_pages=max_pages)
+
+    @pipeline.stage("analyze", deps=["crawl"])
+    def analyze(results):
+        # 分析結果はanalyze_items内でsales_dataに保存される
+        return sales.analyze_items(results.get("crawl") or [], category_id=category_id, category_label=category_label)
+
+    @pipeline.stage("history", deps=["analyze"])
+    def history(results):
+        # 各レポートが個別に問い合わせていた履歴をまとめて1回だけ取得（古い順）。
+        # analyzeが書いたのと同じカテゴリに絞り、他の系列の行が混ざらないようにする
+        periods = max(trend_engine.TREND_PERIODS, ai_profitable_items_trend.TREND_AI_PERIODS)
+        return trend_engine.load_history(clients.get_supabase(), periods, category=category_label)
+
+    @pipeline.stage("trend", deps=["history"])
+    def trend(results):
+        trend_report.main(results["history"])
+
+    @pipeline.stage("ai_profit", deps=["history"])
+    def ai_profit(results):
+        rows = results["history"]
+        ai_profitable_items.main(rows[-1] if rows else None)
+
+    @pipeline.stage("ai_trend", deps=["history"])
+    def ai_trend(results):
+        newest_first = results["history"][::-1]
+        ai_profitable_items_trend.main(newest_first[:ai_profitable_items_trend.TREND_AI_PERIODS])
+
+    return pipeline
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="取得→分析→保存→トレンド→AIレポートを1プロセスで実行")
+    parser.add_argument("--skip", nargs="*", default=[], help="実行しないステージ名（例: crawl analyze）")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("PIPELINE_WORKERS", "4")))
+    args = parser.parse_args()
+
+    print("🌍 eBay 市場分析パイプライン")
+    build_weekly_pipeline().run(workers=args.workers, skip=args.skip)
+
+    # SLACK_QUEUE=1のときはバックグラウンドに残った通知を送り切ってから終了
+    import slack_notify
+    slack_notify.flush()
+    metrics.flush()
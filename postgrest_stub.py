@@ -0,0 +1,146 @@
+import json
+import random
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ===============================
+# ① ローカル用PostgREST互換サーバー
+# ===============================
+# SUPABASE_URL=http://127.0.0.1:54321 を指定すると、
+# Supabaseクライアントの insert / upsert / select をメモリ上で受け付ける。
+
+
+class PostgrestStub:
+    """テーブルごとの行をメモリに保持し、失敗を一定確率で注入できるスタブ"""
+
+    def __init__(self, fail_rate=0.0, seed=None):
+        self.tables = {}
+        self.fail_rate = fail_rate
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def write(self, table, rows, on_conflict=None, merge=False):
+        with self._lock:
+            stored = self.tables.setdefault(table, [])
+            if not on_conflict:
+                stored.extend(rows)
+                return rows
+            index = {row.get(on_conflict): i for i, row in enumerate(stored)}
+            for row in rows:
+                i = index.get(row.get(on_conflict))
+                if i is None:
+                    index[row.get(on_conflict)] = len(stored)
+                    stored.append(dict(row))
+                elif merge:
+                    stored[i].update(row)
+            return rows
+
+    def read(self, table, query):
+        with self._lock:
+            rows = list(self.tables.get(table, []))
+        for key, values in query.items():
+            if key in ("select", "order", "limit", "offset", "on_conflict"):
+                continue
+            op, _, value = values[0].partition(".")
+            if op == "eq":
+                rows = [r for r in rows if str(r.get(key)) == value]
+            elif op in ("gte", "lte", "gt", "lt"):
+                compare = {"gte": str.__ge__, "lte": str.__le__, "gt": str.__gt__, "lt": str.__lt__}[op]
+                rows = [r for r in rows if r.get(key) is not None and compare(str(r.get(key)), value)]
+        for spec in reversed(query.get("order", [""])[0].split(",")):
+            if not spec:
+                continue
+            # column.asc|desc[.nullsfirst|.nullslast]。指定がなければPostgreSQLと同じく降順のときだけNULLが先
+            column, *modifiers = spec.split(".")
+            desc = "desc" in modifiers
+            nulls_first = "nullsfirst" in modifiers or (desc and "nullslast" not in modifiers)
+            nulls = [r for r in rows if r.get(column) is None]
+            values = sorted((r for r in rows if r.get(column) is not None), key=lambda r: r.get(column), reverse=desc)
+            rows = nulls + values if nulls_first else values + nulls
+        offset = int(query.get("offset", ["0"])[0])
+        limit = query.get("limit")
+        rows = rows[offset:]
+        if limit:
+            rows = rows[:int(limit[0])]
+        return rows
+
+
+def _make_handler(stub):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _table(self):
+            path = urlparse(self.path).path
+            prefix = "/rest/v1/"
+            return path[len(prefix):] if path.startswith(prefix) else None
+
+        def _reply(self, status, body=None):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8") if body is not None else b""
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _maybe_fail(self):
+            stub.requests += 1
+            if stub.fail_rate and stub._rng.random() < stub.fail_rate:
+                self._reply(503, {"message": "injected failure"})
+                return True
+            return False
+
+        def do_GET(self):
+            table = self._table()
+            if table is None:
+                return self._reply(404, {"message": "not found"})
+            if self._maybe_fail():
+                return
+            query = parse_qs(urlparse(self.path).query)
+            self._reply(200, stub.read(table, query))
+
+        def do_POST(self):
+            table = self._table()
+            if table is None:
+                return self._reply(404, {"message": "not found"})
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"[]")
+            if self._maybe_fail():
+                return
+            rows = body if isinstance(body, list) else [body]
+            query = parse_qs(urlparse(self.path).query)
+            prefer = self.headers.get("Prefer", "")
+            stub.write(
+                table,
+                rows,
+                on_conflict=query.get("on_conflict", [None])[0],
+                merge="resolution=merge-duplicates" in prefer,
+            )
+            if "return=minimal" in prefer:
+                return self._reply(201)
+            self._reply(201, rows)
+
+    return Handler
+
+
+def serve(port=54321, fail_rate=0.0, seed=None):
+    """バックグラウンドスレッドでスタブを起動し、(server, stub)を返す"""
+    stub = PostgrestStub(fail_rate=fail_rate, seed=seed)
+    server = ThreadingHTTPServer(("127.0.0.1", port), _make_handler(stub))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stub
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ローカル用PostgREST互換スタブ")
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="503を返す確率（リトライ確認用）")
+    args = parser.parse_args()
+
+    stub = PostgrestStub(fail_rate=args.fail_rate)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), _make_handler(stub))
+    print(f"🧪 PostgRESTスタブ起動: http://127.0.0.1:{args.port}（SUPABASE_URLに指定）")
+    server.serve_forever()
@@ -0,0 +1,129 @@
+import sys
+import base64
+import argparse
+
+import numpy as np
+
+import clients
+
+# ===============================
+# ① 設定
+# ===============================
+# sales_data の各行には、その回の価格分布をKLLスケッチにした price_sketch（全体）と
+# character_sketches（保存したキャラごと）が入っている。KLLスケッチは各レベルの値に重み 2^レベル
+# を付けた標本なので、複数回分の値と重みをつなげて並べ替えるだけで期間全体の分位点・ヒストグラムになる。
+# 生データの再取得なしに週・月・四半期の統計を出せる。
+PAGE_SIZE = 1000
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+SKETCH_COLUMNS = "date,category,total_sales,min_price,max_price,price_sketch,character_sketches"
+
+
+# ===============================
+# ② 期間の行を取得
+# ===============================
+def load_rows(client, since=None, until=None, category=None):
+    """期間内（日付の両端を含む）のsales_dataを古い順に取得する"""
+    rows = []
+    while True:
+        query = client.table("sales_data").select(SKETCH_COLUMNS)
+        if since:
+            query = query.gte("date", since)
+        if until:
+            query = query.lte("date", until)
+        if category:
+            query = query.eq("category", category)
+        page = query.order("date").range(len(rows), len(rows) + PAGE_SIZE - 1).execute().data
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+
+
+# ===============================
+# ③ スケッチの合算
+# ===============================
+class Rollup:
+    """複数回分のスケッチをまとめた重み付き標本。分位点・ヒストグラムは二分探索とnp.histogramで求める"""
+
+    def __init__(self, sketches):
+        values, weights = [], []
+        self.count = 0
+        self.runs = 0
+        for sketch in sketches:
+            if not sketch:
+                continue
+            raw = np.frombuffer(base64.b64decode(sketch["values"]), dtype="<f4")
+            values.append(raw.astype(float))
+            weights.append(np.repeat(2.0 ** np.arange(len(sketch["sizes"])), sketch["sizes"]))
+            self.count += sketch["n"]
+            self.runs += 1
+        values = np.concatenate(values) if values else np.empty(0)
+        weights = np.concatenate(weights) if weights else np.empty(0)
+        order = np.argsort(values, kind="stable")
+        self.values = values[order]
+        self.weights = weights[order]
+        self.cumulative = np.cumsum(self.weights)
+
+    def __bool__(self):
+        return bool(len(self.values))
+
+    def quantiles(self, qs=QUANTILES):
+        """分位点（0〜1）をまとめて返す（KLLSketch.quantilesと同じ定義）"""
+        if not self:
+            return [float("nan") for _ in qs]
+        targets = np.asarray(qs, dtype=float) * self.cumulative[-1]
+        positions = np.minimum(np.searchsorted(self.cumulative, targets), len(self.values) - 1)
+        return self.values[positions].tolist()
+
+    def quantile(self, q):
+        return self.quantiles([q])[0]
+
+    def histogram(self, bins=10, range=None):
+        """(件数の推定値, 区間の境界) を返す。件数の合計はおよそcountになる"""
+        if not self:
+            return np.zeros(bins), np.zeros(bins + 1)
+        counts, edges = np.histogram(self.values, bins=bins, range=range, weights=self.weights)
+        return counts, edges
+
+
+def rollup(rows, character=None):
+    """行のリストから全体（characterを指定したらそのキャラ）のRollupを作る"""
+    if character:
+        return Rollup((row.get("character_sketches") or {}).get(character) for row in rows)
+    return Rollup(row.get("price_sketch") for row in rows)
+
+
+# ===============================
+# ④ 表示・コマンドライン
+# ===============================
+def print_rollup(result, bins=10, label="全体"):
+    if not result:
+        print(f"⚠️ {label}: スケッチが保存された回がありません")
+        return
+    print(f"\n📊 {label}: {result.runs}回分・推定 {result.count} 件")
+    for q, value in zip(QUANTILES, result.quantiles(QUANTILES)):
+        print(f"- p{round(q * 100)}: ${value:.2f}")
+    counts, edges = result.histogram(bins)
+    peak = max(counts.max(), 1)
+    for count, lo, hi in zip(counts, edges[:-1], edges[1:]):
+        print(f"  ${lo:>9.2f} 〜 ${hi:>9.2f} | {'█' * int(round(30 * count / peak)):<30} {count:.0f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="保存済みスケッチから期間の価格分布を集計する")
+    parser.add_argument("--since", help="開始日（例: 2026-07-01）")
+    parser.add_argument("--until", help="終了日（例: 2026-09-30）")
+    parser.add_argument("--category", help="カテゴリ名で絞り込む（例: ポケモンカード）")
+    parser.add_argument("--character", action="append", default=[], help="キャラ別にも集計する（複数指定可）")
+    parser.add_argument("--bins", type=int, default=10, help="ヒストグラムの区間数")
+    args = parser.parse_args(argv)
+
+    rows = load_rows(clients.get_supabase(), args.since, args.until, args.category)
+    print(f"📅 対象: {len(rows)} 回（{args.since or '最初'} 〜 {args.until or '最新'}）")
+    print_rollup(rollup(rows), args.bins)
+    for character in args.character:
+        print_rollup(rollup(rows, character.lower()), args.bins, label=character.title())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
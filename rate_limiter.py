@@ -0,0 +1,84 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# ===============================
+# トークンバケット方式のレート制限
+# ===============================
+class TokenBucket:
+    """429とRetry-Afterに応じて送信レートを自動調整するトークンバケット"""
+
+    def __init__(self, rate=5.0, capacity=5, min_rate=0.5):
+        self.max_rate = float(rate)
+        self.min_rate = float(min_rate)
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated = now
+
+    def _reserve(self):
+        """トークンを1つ確保できれば0、できなければ待機秒数を返す"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """スレッドから呼ぶ同期版"""
+        while True:
+            wait = self._reserve()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """asyncioタスクから呼ぶ非同期版"""
+        while True:
+            wait = self._reserve()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def on_success(self):
+        """成功時は少しずつレートを戻す（加算的増加）"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.1)
+
+    def on_throttle(self, retry_after=None):
+        """429時はレートを半減し、Retry-Afterの間は全リクエストを止める"""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0.0
+            wait = retry_after if retry_after is not None else 1.0 / self.rate
+            self.blocked_until = max(self.blocked_until, time.monotonic() + wait)
+
+
+def parse_retry_after(value, default=None):
+    """Retry-Afterヘッダー（秒数またはHTTP日付）を待機秒数に変換"""
+    if value is None:
+        return default
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
@@ -0,0 +1,166 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+import clients
+import metrics
+
+# ===============================
+# ① キャッシュ設定
+# ===============================
+# off: キャッシュしない / on: TTL付きで読み書き / replay: 記録済みページのみ返す（通信なし）
+CACHE_MODE = os.getenv("EBAY_CACHE_MODE", "off").lower()
+CACHE_DIR = os.getenv("EBAY_CACHE_DIR", ".ebay_cache")
+CACHE_TTL = int(os.getenv("EBAY_CACHE_TTL", "86400"))  # 秒
+CACHE_MAX_MB = float(os.getenv("EBAY_CACHE_MAX_MB", "200"))
+EVICT_TARGET = 0.9  # 上限を超えたら上限のこの割合まで削除する（削除のたびに全走査しないよう余裕を持たせる）
+
+# キャッシュの合計サイズ（バイト）。最初の書き込み時に1回だけ数え、以降は書き込みごとに加算する
+_size = None
+_size_lock = threading.Lock()
+
+
+class CachedResponse:
+    """requests.Responseの代わりに返す最小限のレスポンス"""
+
+    def __init__(self, status_code, text, headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+    def json(self):
+        return json.loads(self.text)
+
+    @property
+    def content(self):
+        return self.text.encode("utf-8")
+
+
+# ===============================
+# ② キー生成（URL・パラメータ・マーケットプレイス）
+# ===============================
+def cache_key(url, params=None, headers=None):
+    marketplace = (headers or {}).get("X-EBAY-C-MARKETPLACE-ID")
+    payload = json.dumps(
+        {"url": url, "params": {k: str(v) for k, v in (params or {}).items()}, "marketplace": marketplace},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _path(key):
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.json")
+
+
+def lookup(url, params=None, headers=None):
+    """キャッシュ済みレスポンスを返す（なければNone）。replayではTTLを無視する"""
+    if CACHE_MODE not in ("on", "replay"):
+        return None
+    path = _path(cache_key(url, params, headers))
+    try:
+        with open(path, encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if CACHE_MODE == "on" and time.time() - entry["created"] > CACHE_TTL:
+        return None
+    try:
+        os.utime(path)  # 最終利用時刻を更新（LRU削除用）
+    except OSError:
+        pass  # 読み取り専用のキャッシュ（replay用の固定データなど）でもヒットとして返す
+    return CachedResponse(entry["status_code"], entry["body"], entry.get("headers"))
+
+
+def store(url, params, headers, res):
+    """200応答のみ保存し、容量上限を超えたら古いものから削除"""
+    if CACHE_MODE != "on" or res.status_code != 200:
+        return
+    path = _path(cache_key(url, params, headers))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    entry = {
+        "created": time.time(),
+        "status_code": res.status_code,
+        "headers": {"Content-Type": res.headers.get("Content-Type", "application/json")},
+        "body": res.text,
+    }
+    # 同じキーを複数スレッド・プロセスが同時に書いても衝突しないよう、一時ファイル名は書き手ごとに分ける
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        old_size = os.path.getsize(path)
+    except OSError:
+        old_size = 0
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(entry, f, ensure_ascii=False)
+    new_size = os.path.getsize(tmp)
+    os.replace(tmp, path)
+
+    global _size
+    with _size_lock:
+        if _size is None:
+            _size = _scan_size()
+        else:
+            _size += new_size - old_size
+        over = _size > CACHE_MAX_MB * 1024 * 1024
+    if over:
+        evict()
+
+
+def _entries():
+    """キャッシュファイルの (最終利用時刻, サイズ, パス)。書き込み途中の一時ファイルは含めない"""
+    entries = []
+    for root, _, files in os.walk(CACHE_DIR):
+        for name in files:
+            if name.endswith(".tmp"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+    return entries
+
+
+def _scan_size():
+    return sum(size for _, size, _ in _entries())
+
+
+def evict(max_bytes=None):
+    """合計サイズが上限を超えていれば、最終利用が古い順に上限のEVICT_TARGETまで削除"""
+    global _size
+    max_bytes = CACHE_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+    with _size_lock:
+        entries = _entries()
+        total = sum(size for _, size, _ in entries)
+        if total > max_bytes:
+            for _, size, path in sorted(entries):
+                if total <= max_bytes * EVICT_TARGET:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+        _size = total
+
+
+# ===============================
+# ③ キャッシュ経由のGET
+# ===============================
+def cached_get(url, headers=None, params=None, session=None, timeout=30):
+    """キャッシュにあればそれを返し、なければ通信して保存する"""
+    hit = lookup(url, params, headers)
+    if hit is not None:
+        metrics.inc("ebay_cache_hits_total")
+        return hit
+    if CACHE_MODE == "replay":
+        return CachedResponse(504, "⚠️ リプレイ用キャッシュに該当するページがありません。")
+
+    with metrics.timer("ebay_request_seconds"):
+        res = (session or clients.get_http_session()).get(url, headers=headers, params=params, timeout=timeout)
+    metrics.inc("ebay_requests_total", status=res.status_code)
+    metrics.inc("ebay_bytes_total", len(res.content))
+    store(url, params, headers, res)
+    return res
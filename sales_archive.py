@@ -0,0 +1,104 @@
+import os
+import uuid
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
+
+import item_records
+
+# ===============================
+# ① アーカイブ設定
+# ===============================
+ARCHIVE_DIR = os.getenv("SALES_ARCHIVE_DIR", "sales_archive")
+ARCHIVE_COMPRESSION = os.getenv("SALES_ARCHIVE_COMPRESSION", "zstd")
+
+SCHEMA = pa.schema([
+    ("item_id", pa.string()),
+    ("title", pa.string()),
+    ("price", pa.float64()),
+    ("currency", pa.dictionary(pa.int8(), pa.string())),
+    ("seller", pa.dictionary(pa.int32(), pa.string())),
+    ("sold_date", pa.string()),
+])
+
+
+def _to_columns(items):
+    """出品レコードから保存する列だけを取り出す"""
+    items = item_records.as_records(items)
+    columns = {
+        "item_id": [item.item_id for item in items],
+        "title": [item.title for item in items],
+        "price": [None if item.price != item.price else item.price for item in items],
+        "currency": [item.currency for item in items],
+        "seller": [item.seller for item in items],
+        "sold_date": [item.sold_date for item in items],
+    }
+    return pa.table(columns, schema=SCHEMA)
+
+
+# ===============================
+# ② 実行ごとの書き込み（日付・カテゴリでパーティション分割）
+# ===============================
+class RunArchive:
+    """1回の実行分のアイテムをParquetに追記していく（ページ単位で書ける）"""
+
+    def __init__(self, category_id, run_at=None, root=ARCHIVE_DIR):
+        run_at = run_at or datetime.now()
+        directory = os.path.join(root, f"date={run_at:%Y-%m-%d}", f"category={category_id}")
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"run-{run_at:%H%M%S}-{uuid.uuid4().hex[:8]}.parquet")
+        self.rows = 0
+        self._writer = None
+
+    def write(self, items):
+        if not items:
+            return
+        table = _to_columns(items)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, SCHEMA, compression=ARCHIVE_COMPRESSION)
+        self._writer.write_table(table)
+        self.rows += table.num_rows
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            print(f"🗄 アーカイブ保存: {self.path}（{self.rows} 件）")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_run(items, category_id, run_at=None, root=ARCHIVE_DIR):
+    with RunArchive(category_id, run_at, root) as archive:
+        archive.write(items)
+    return archive.path
+
+
+# ===============================
+# ③ 読み込み（メモリマップで全期間をスキャン）
+# ===============================
+def load_history(columns=None, start=None, end=None, category_id=None, root=ARCHIVE_DIR):
+    """アーカイブをpyarrow.Tableとして読み込む（start/endは'YYYY-MM-DD'）"""
+    dataset = ds.dataset(
+        root,
+        format="parquet",
+        partitioning=ds.partitioning(
+            pa.schema([("date", pa.string()), ("category", pa.string())]), flavor="hive"
+        ),
+        filesystem=fs.LocalFileSystem(use_mmap=True),
+    )
+    condition = None
+    for expr in (
+        ds.field("date") >= start if start else None,
+        ds.field("date") <= end if end else None,
+        ds.field("category") == str(category_id) if category_id else None,
+    ):
+        if expr is not None:
+            condition = expr if condition is None else condition & expr
+    return dataset.to_table(columns=columns, filter=condition)
@@ -0,0 +1,305 @@
+import os
+import sys
+import json
+import math
+import time
+import heapq
+import argparse
+
+import numpy as np
+
+import clients
+import metrics
+import slack_notify
+import fanout_runner
+import state_file
+import jp_pokemon_sales_no_sort as sales
+
+# ===============================
+# ① スケジューラーの設定
+# ===============================
+# 週1回のcronで全区分を一律に取得する代わりに、常駐プロセスが区分（カテゴリ・検索ワード・キャラ）ごとに
+# sales_dataの直近の値動きと販売数から取得間隔を決め、期限が来た区分から優先度付きキューで取得する。
+# 各区分の実行回数は重みに比例して1日のAPI呼び出し予算を配分するので、合計の呼び出し数は予算内に収まる。
+SCHEDULE_SEGMENTS = os.getenv("SCHEDULE_SEGMENTS", "schedule_segments.json")  # 例は schedule_segments.example.json
+SCHEDULE_STATE = os.getenv("SCHEDULE_STATE", "schedule_state.json")  # 実行予定と呼び出し履歴の保存先
+SCHEDULE_DAILY_CALLS = int(os.getenv("SCHEDULE_DAILY_CALLS", "200"))  # 24時間あたりのeBay API呼び出し上限（全区分合計）
+SCHEDULE_MIN_HOURS = float(os.getenv("SCHEDULE_MIN_HOURS", "1"))  # 最短の取得間隔
+SCHEDULE_MAX_HOURS = float(os.getenv("SCHEDULE_MAX_HOURS", "168"))  # 最長の取得間隔（値動きがなくても週1回は取得）
+SCHEDULE_WINDOW = int(os.getenv("SCHEDULE_WINDOW", "8"))  # 値動き・販売数を見る直近の回数
+SCHEDULE_HISTORY_ROWS = int(os.getenv("SCHEDULE_HISTORY_ROWS", "2000"))  # 計画のために読むsales_dataの行数
+SCHEDULE_ALERT_Z = float(os.getenv("SCHEDULE_ALERT_Z", "3"))  # 前回比が普段の値動きのこの倍を超えたらSlack通知（0で無効）
+SLACK_CHANNEL = os.getenv("SLACK_CHANNEL")
+WEEKLY_CATEGORY = os.getenv("WEEKLY_CATEGORY", "ポケモンカード")  # 週次レポートの系列（区分名には使えない）
+VOLATILITY_FLOOR = 0.02  # 値動きのない区分にも最低限の重みを持たせる
+DAY = 86400
+HISTORY_COLUMNS = "date,run_at,category,total_sales,median_price,top_characters"
+
+
+def load_segments(path=None):
+    """[{label, category_id, marketplace, query, character, parent, max_pages}, ...] 形式の区分一覧を読み込む"""
+    with open(path or SCHEDULE_SEGMENTS, encoding="utf-8") as f:
+        segments = json.load(f)
+    for segment in segments:
+        segment.setdefault("category_id", "183454")
+        segment.setdefault("marketplace", sales.MARKETPLACE_ID)
+        segment.setdefault("exclude", "pokemon")
+        segment.setdefault("limit", 100)
+        segment.setdefault("max_pages", 10)
+        if segment.get("character"):
+            segment.setdefault("query", segment["character"])
+        segment.setdefault("label", segment.get("query") or f"{segment['category_id']}@{segment['marketplace']}")
+        if segment["label"] == WEEKLY_CATEGORY:
+            # 区分の行は区分名をcategoryにして保存されるので、同じ名前だと週次の系列に1日何回も行が混ざる
+            raise ValueError(
+                f"区分名 \"{segment['label']}\" は週次レポートのカテゴリ（WEEKLY_CATEGORY）と同じです。"
+                f"別の名前（例: \"{segment['label']} (scheduler)\"）にしてください"
+            )
+    return segments
+
+
+def load_state(path=None):
+    state = state_file.load_json(path or SCHEDULE_STATE)
+    state.setdefault("segments", {})
+    state.setdefault("calls", [])
+    return state
+
+
+def save_state(state, path=None):
+    state_file.save_json(path or SCHEDULE_STATE, state)
+
+
+# ===============================
+# ② 値動き・販売数から重みを計算
+# ===============================
+def load_history(client, limit=SCHEDULE_HISTORY_ROWS):
+    """直近のsales_dataを古い順に返す（同じ日の行はrun_at順）"""
+    query = client.table("sales_data").select(HISTORY_COLUMNS)
+    rows = query.order("date", desc=True).order("run_at", desc=True, nullsfirst=False).limit(limit).execute().data
+    return sorted(rows, key=lambda row: (row.get("date") or "", row.get("run_at") or ""))
+
+
+def segment_series(rows, segment):
+    """区分の (価格, 件数) の時系列（古い順）。キャラ区分はtop_charactersの平均価格と件数を使う。
+    取得条件の違う行を混ぜると価格の段差が値動きに見えるので、区分自身の行があればそれだけを使い、
+    まだなければ親カテゴリ（parent）の行で代用する"""
+    character = segment.get("character")
+    own = [row for row in rows if row.get("category") == segment["label"]]
+    source = own or [row for row in rows if segment.get("parent") and row.get("category") == segment["parent"]]
+    series = []
+    for row in source:
+        if character:
+            stats = (row.get("top_characters") or {}).get(character) or {}
+            if stats.get("count") and stats.get("avg"):
+                series.append((stats["avg"], stats["count"]))
+        elif row.get("median_price"):
+            series.append((row["median_price"], row.get("total_sales") or 0))
+    return series[-SCHEDULE_WINDOW:]
+
+
+def signals(series):
+    """(変動率, 1日あたりの販売数) を返す。変動率は対数価格の前回比の標準偏差（3回分未満ならNone）"""
+    if not series:
+        return None, None
+    prices = np.array([price for price, _ in series], dtype=float)
+    counts = np.array([count for _, count in series], dtype=float)
+    # 各回は過去WINDOW_DAYS日の販売を数えているので、日数で割って1日あたりにする
+    velocity = float(counts.mean()) / sales.WINDOW_DAYS
+    if len(prices) < 3:
+        return None, velocity
+    return float(np.std(np.diff(np.log(prices)))), velocity
+
+
+def weight(volatility, velocity):
+    """値動きが大きく、よく売れている区分ほど重くする"""
+    return (volatility + VOLATILITY_FLOOR) * math.log1p(velocity)
+
+
+# ===============================
+# ③ API予算の配分
+# ===============================
+def allocate(weights, costs, budget=SCHEDULE_DAILY_CALLS):
+    """重みに比例して1日あたりの実行回数を配り、{区分: 間隔（秒）}を返す。
+    上下限に当たった区分はその回数で固定し、残りの予算を残りの区分で配り直す"""
+    low, high = 24 / SCHEDULE_MAX_HOURS, 24 / SCHEDULE_MIN_HOURS  # 1日あたりの実行回数の下限・上限
+    rates = {}
+    free = dict(weights)
+    remaining = float(budget)
+    while free:
+        total = sum(w * costs[label] for label, w in free.items())
+        proposed = {label: remaining * w / total if total > 0 and remaining > 0 else 0.0 for label, w in free.items()}
+        clamped = {label: min(max(rate, low), high) for label, rate in proposed.items() if not low <= rate <= high}
+        if not clamped:
+            rates.update(proposed)
+            break
+        for label, rate in clamped.items():
+            rates[label] = rate
+            remaining -= rate * costs[label]
+            del free[label]
+    return {label: DAY / rate for label, rate in rates.items()}
+
+
+def replan(client, segments, state):
+    """履歴から各区分の重みを求め、取得間隔を決め直して状態に書き込む"""
+    rows = load_history(client)
+    weights, costs = {}, {}
+    for segment in segments:
+        label = segment["label"]
+        volatility, velocity = signals(segment_series(rows, segment))
+        entry = state["segments"].setdefault(label, {})
+        entry.update(volatility=volatility, velocity=velocity)
+        weights[label] = None if volatility is None else weight(volatility, velocity)
+        costs[label] = segment["max_pages"]
+    # 履歴が3回分に満たない区分は既知の区分の中央値の重みで扱う（未実行の区分は初回すぐに取得される）
+    known = [w for w in weights.values() if w is not None]
+    default = float(np.median(known)) if known else 1.0
+    weights = {label: default if w is None else w for label, w in weights.items()}
+    for label, interval in allocate(weights, costs).items():
+        state["segments"][label]["interval"] = interval
+    return rows
+
+
+def build_queue(segments, state, now):
+    """(次回実行時刻, 間隔, 区分名) のヒープを作る（未実行の区分は今すぐ。同時刻なら間隔の短い区分から）"""
+    queue = []
+    for segment in segments:
+        entry = state["segments"][segment["label"]]
+        last_run = entry.get("last_run")
+        entry["next_run"] = now if last_run is None else last_run + entry["interval"]
+        queue.append((entry["next_run"], entry["interval"], segment["label"]))
+    heapq.heapify(queue)
+    return queue
+
+
+def budget_wait(state, cost, now, budget=SCHEDULE_DAILY_CALLS):
+    """直近24時間の呼び出し数にcostを足して予算内なら0、超えるなら空くまでの秒数を返す"""
+    state["calls"] = [[at, n] for at, n in state["calls"] if at > now - DAY]
+    excess = sum(n for _, n in state["calls"]) + cost - budget
+    if excess <= 0:
+        return 0.0
+    # 古い呼び出しから順に24時間の枠を外れていくので、超過分が外れる時刻まで待つ
+    for at, n in state["calls"]:
+        excess -= n
+        if excess <= 0:
+            return at + DAY - now
+    # 1回分だけで予算を超える区分は、直近24時間の呼び出しがなくなってから実行する
+    return state["calls"][-1][0] + DAY - now if state["calls"] else 0.0
+
+
+# ===============================
+# ④ 1区分の取得・分析
+# ===============================
+def run_segment(segment):
+    """区分を取得・分析してsales_dataに保存し、(使ったAPI呼び出し数, 保存した行) を返す"""
+    exclude = segment["exclude"]
+    sales.configure(
+        marketplace=segment["marketplace"],
+        exclude_keywords=fanout_runner.EXCLUDE_PROFILES[exclude] if isinstance(exclude, str) else exclude,
+    )
+    items = sales.fetch_all_items(
+        category_id=segment["category_id"], limit=segment["limit"], max_pages=segment["max_pages"],
+        query=segment.get("query"),
+    )
+    row = sales.analyze_items(items, category_id=segment["category_id"], category_label=segment["label"])
+    # 最後のページは件数がlimit未満になるので、取得件数から実際に呼んだページ数がわかる
+    calls = min(segment["max_pages"], len(items) // segment["limit"] + 1)
+    return calls, row
+
+
+def check_spike(rows, segment):
+    """最新の前回比が普段の値動きのSCHEDULE_ALERT_Z倍を超えていれば通知文を返す"""
+    series = segment_series(rows, segment)
+    if SCHEDULE_ALERT_Z <= 0 or len(series) < 4:
+        return None
+    changes = np.diff(np.log([price for price, _ in series]))
+    usual = max(float(np.std(changes[:-1])), VOLATILITY_FLOOR)
+    if abs(changes[-1]) < SCHEDULE_ALERT_Z * usual:
+        return None
+    before, after = series[-2][0], series[-1][0]
+    icon = "🚀" if after > before else "📉"
+    return (f"{icon} {segment['label']} の価格が急変: ${before:.2f} → ${after:.2f}"
+            f"（{(after / before - 1) * 100:+.1f}%、普段の変動の {abs(changes[-1]) / usual:.1f} 倍）")
+
+
+# ===============================
+# ⑤ 常駐ループ
+# ===============================
+def run(segments, state_path=None, once=False, client=None):
+    """期限が来た区分から順に取得する。once=Trueなら今期限の区分だけ処理して終了"""
+    client = client or clients.get_supabase()
+    state = load_state(state_path)
+    replan(client, segments, state)
+    by_label = {segment["label"]: segment for segment in segments}
+    queue = build_queue(segments, state, time.time())
+    save_state(state, state_path)
+    print_plan(segments, state)
+
+    while queue:
+        due, interval, label = queue[0]
+        now = time.time()
+        if due > now:
+            if once:
+                break
+            time.sleep(min(due - now, 60))  # 長く眠りすぎず、停止(Ctrl+C)にもすぐ応じる
+            continue
+        heapq.heappop(queue)
+        segment = by_label[label]
+        wait = budget_wait(state, segment["max_pages"], now)
+        if wait > 0:
+            print(f"⏸ [{label}] API予算（{SCHEDULE_DAILY_CALLS}回/24時間）の上限のため {wait / 60:.0f} 分後に延期")
+            heapq.heappush(queue, (now + wait, interval, label))
+            continue
+
+        print(f"\n🚀 [{label}] 取得開始（間隔 {interval / 3600:.1f} 時間）")
+        try:
+            calls, row = run_segment(segment)
+        except Exception as e:
+            # 失敗しても予算を使ったものとして扱い、次の間隔まで待つ
+            print(f"⚠️ [{label}] 取得失敗: {e}")
+            calls, row = segment["max_pages"], None
+        finished = time.time()
+        state["calls"].append([finished, calls])
+        state["segments"][label]["last_run"] = finished
+        metrics.inc("scheduler_runs_total", segment=label)
+        metrics.inc("scheduler_api_calls_total", calls)
+
+        rows = replan(client, segments, state)
+        if row:
+            message = check_spike(rows, segment)
+            if message:
+                print(message)
+                slack_notify.notify(SLACK_CHANNEL, message)
+        queue = build_queue(segments, state, finished)
+        save_state(state, state_path)
+        # 常駐中に計測がたまり続けないよう、区分ごとに書き出して空にする
+        metrics.flush()
+        metrics.reset()
+
+    slack_notify.flush()
+    metrics.flush()
+    return state
+
+
+def print_plan(segments, state):
+    print(f"\n🗓 取得計画（API予算 {SCHEDULE_DAILY_CALLS}回/24時間）")
+    for segment in sorted(segments, key=lambda s: state["segments"][s["label"]]["interval"]):
+        entry = state["segments"][segment["label"]]
+        volatility = "-" if entry.get("volatility") is None else f"{entry['volatility']:.3f}"
+        velocity = "-" if entry.get("velocity") is None else f"{entry['velocity']:.1f}"
+        print(f"- {segment['label']} : {entry['interval'] / 3600:.1f} 時間ごと"
+              f"（変動率 {volatility} / 販売 {velocity}件/日 / 1回 {segment['max_pages']} 呼び出し）")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="値動きに応じて区分ごとの取得間隔を変える常駐スケジューラー")
+    parser.add_argument("--segments", default=SCHEDULE_SEGMENTS, help="区分一覧のJSONファイル")
+    parser.add_argument("--state", default=SCHEDULE_STATE, help="実行予定の保存先")
+    parser.add_argument("--once", action="store_true", help="今期限の区分だけ取得して終了する（cronから呼ぶ場合）")
+    args = parser.parse_args()
+
+    print("🌍 eBay 市場分析スケジューラー")
+    try:
+        run(load_segments(args.segments), state_path=args.state, once=args.once)
+    except KeyboardInterrupt:
+        print("\n🛑 停止しました（次回は保存した予定から再開します）")
+        sys.exit(0)
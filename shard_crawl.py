@@ -0,0 +1,210 @@
+import os
+from dataclasses import dataclass
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+import jp_pokemon_sales_no_sort as sales
+import clients
+import metrics
+import item_records
+from rate_limiter import TokenBucket, parse_retry_after
+import response_cache
+
+# ===============================
+# ① シャード分割の設定
+# ===============================
+OFFSET_CAP = int(os.getenv("EBAY_OFFSET_CAP", "10000"))  # Browse APIで辿れるoffset+limitの上限
+SHARD_WORKERS = int(os.getenv("EBAY_SHARD_WORKERS", "4"))
+MIN_WINDOW = timedelta(hours=1)  # これ以上は期間を分割しない
+MIN_PRICE_SPAN = 0.02  # これ以上は価格帯を分割しない
+PAGE_LIMIT = 200  # Browse APIの1ページ最大件数
+MAX_RETRIES = 5  # 429を受けたときの再試行回数
+
+_bucket = TokenBucket(rate=sales.FETCH_RATE, capacity=SHARD_WORKERS)
+
+
+@dataclass
+class Shard:
+    start: object
+    end: object
+    price_min: float
+    price_max: float
+    total: int = 0
+
+    @property
+    def filter(self):
+        return sales.build_filter(self.start, self.end, self.price_min, self.price_max)
+
+    def __str__(self):
+        return f"{self.start:%Y-%m-%d %H:%M}〜{self.end:%Y-%m-%d %H:%M} ${self.price_min}〜${self.price_max}"
+
+
+class ShardError(Exception):
+    """シャードの件数確認・取得に失敗した（空として扱わない）"""
+
+
+class IncompleteCrawl(Exception):
+    """一部のシャードを取得できなかった。取得できた分はitems、失敗したシャードはfailedに入る"""
+
+    def __init__(self, items, failed):
+        super().__init__(f"{len(failed)} 件のシャードを取得できませんでした")
+        self.items = items
+        self.failed = failed
+
+
+# ===============================
+# ② 流量制御つきの1リクエスト
+# ===============================
+def _get(params, max_retries=MAX_RETRIES):
+    """トークンバケットで流量を抑えつつ1回取得（429はRetry-Afterに従って再試行）"""
+    cached = response_cache.lookup(sales.BASE_URL, params, sales.HEADERS)
+    if cached is not None:
+        return cached
+
+    for attempt in range(max_retries + 1):
+        _bucket.acquire()
+        res = response_cache.cached_get(sales.BASE_URL, headers=sales.HEADERS, params=params,
+                                        session=clients.get_http_session())
+        if res.status_code != 429:
+            if res.status_code == 200:
+                _bucket.on_success()
+            return res
+        retry_after = parse_retry_after(res.headers.get("Retry-After"))
+        metrics.inc("ebay_retries_total")
+        print(f"⏳ レート制限(429) offset={params['offset']} 再試行 {attempt + 1}/{max_retries}")
+        _bucket.on_throttle(retry_after)
+    return res
+
+
+# ===============================
+# ③ ヒット件数の確認
+# ===============================
+def count_hits(category_id, shard):
+    """limit=1で検索し、シャード内の総ヒット件数を返す（失敗時はShardError）"""
+    res = _get(sales._page_params(category_id, 1, 0, shard.filter))
+    if res.status_code != 200:
+        raise ShardError(f"件数取得エラー（HTTP {res.status_code}）: {res.text[:200]}")
+    return int(res.json().get("total", 0))
+
+
+def _split(shard):
+    """期間を優先して半分に分割し、期間が最小幅なら価格帯を分割する"""
+    if shard.end - shard.start > MIN_WINDOW:
+        mid = shard.start + (shard.end - shard.start) / 2
+        return [
+            Shard(shard.start, mid, shard.price_min, shard.price_max),
+            Shard(mid, shard.end, shard.price_min, shard.price_max),
+        ]
+    if shard.price_max - shard.price_min > MIN_PRICE_SPAN:
+        mid = round((shard.price_min + shard.price_max) / 2, 2)
+        return [
+            Shard(shard.start, shard.end, shard.price_min, mid),
+            Shard(shard.start, shard.end, round(mid + 0.01, 2), shard.price_max),
+        ]
+    return None
+
+
+# ===============================
+# ④ シャード計画（上限を超える限り再帰的に分割）
+# ===============================
+def plan_shards(category_id="183454", start=None, end=None,
+                price_min=sales.PRICE_MIN, price_max=sales.PRICE_MAX, cap=OFFSET_CAP):
+    """全シャードのヒット件数がcap以下になるまで期間・価格帯を分割し、(計画, 件数を確認できなかったシャード)を返す"""
+    default_start, default_end = sales.default_window()
+    frontier = [Shard(start or default_start, end or default_end, price_min, price_max)]
+    planned, failed = [], []
+
+    def count(shard):
+        try:
+            return count_hits(category_id, shard)
+        except ShardError as e:
+            print(f"⚠️ シャード {shard} の件数を確認できません: {e}")
+            failed.append((shard, str(e)))
+            return None
+
+    with ThreadPoolExecutor(max_workers=SHARD_WORKERS) as pool:
+        while frontier:
+            totals = list(pool.map(count, frontier))
+            next_frontier = []
+            for shard, total in zip(frontier, totals):
+                if total is None:
+                    continue
+                shard.total = total
+                if total == 0:
+                    continue
+                if total <= cap:
+                    planned.append(shard)
+                    continue
+                children = _split(shard)
+                if children is None:
+                    print(f"⚠️ これ以上分割できないシャードがあります（{total}件中{cap}件のみ取得）")
+                    planned.append(shard)
+                else:
+                    next_frontier.extend(children)
+            frontier = next_frontier
+
+    print(f"🧩 シャード数: {len(planned)}（推定 {sum(s.total for s in planned)} 件）")
+    return planned, failed
+
+
+# ===============================
+# ⑤ シャードを並列取得してitemIdで重複排除
+# ===============================
+def fetch_shard(category_id, shard, limit=PAGE_LIMIT, cap=OFFSET_CAP):
+    """1シャードの全ページを取得する（途中のエラーはShardErrorにして、途中までの結果を完了扱いにしない）"""
+    items = []
+    for offset in range(0, min(shard.total, cap), limit):
+        res = _get(sales._page_params(category_id, limit, offset, shard.filter))
+        if res.status_code != 200:
+            raise ShardError(f"offset={offset} の取得エラー（HTTP {res.status_code}）: {res.text[:200]}")
+        page, _ = item_records.decode_page(res.content)
+        items.extend(page)
+        if len(page) < limit:
+            break
+    metrics.inc("ebay_items_total", len(items))
+    return items
+
+
+def fetch_sharded(category_id="183454", limit=PAGE_LIMIT, cap=OFFSET_CAP, start=None, end=None):
+    """全シャードを取得して返す。失敗したシャードがあれば取得できた分を持たせてIncompleteCrawlを送出する"""
+    shards, failed = plan_shards(category_id, start=start, end=end, cap=cap)
+
+    def fetch(shard):
+        try:
+            return fetch_shard(category_id, shard, limit, cap)
+        except ShardError as e:
+            print(f"⚠️ シャード {shard} を取得できません: {e}")
+            failed.append((shard, str(e)))
+            return []
+
+    with ThreadPoolExecutor(max_workers=SHARD_WORKERS) as pool:
+        results = list(pool.map(fetch, shards))
+
+    # 境界が重なるシャード間の重複を除去（取得順は維持）
+    seen = set()
+    all_items = []
+    for items in results:
+        for item in items:
+            item_id = item.item_id
+            if item_id is not None:
+                if item_id in seen:
+                    continue
+                seen.add(item_id)
+            all_items.append(item)
+
+    print(f"✅ シャード取得件数（重複排除後）: {len(all_items)} 件")
+    if failed:
+        raise IncompleteCrawl(all_items, failed)
+    return all_items
+
+
+if __name__ == "__main__":
+    print("🌍 eBay ポケモンカード市場分析（シャード分割クロール）")
+    try:
+        items = fetch_sharded()
+    except IncompleteCrawl as e:
+        print(f"⚠️ {e}。取得できた {len(e.items)} 件だけで集計します（欠けた範囲は以下）")
+        for shard, reason in e.failed:
+            print(f"- {shard}: {reason}")
+        items = e.items
+    sales.analyze_items(items)
@@ -1,18 +1,206 @@
-from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
 import os
+import time
+import queue
+import atexit
+import threading
+from slack_sdk.errors import SlackApiError
+
+import clients
+import metrics
+from rate_limiter import TokenBucket, parse_retry_after
+
+clients.load_env()
+
+# ===============================
+# ① 設定
+# ===============================
+SLACK_QUEUE = os.getenv("SLACK_QUEUE", "0") == "1"  # 1ならバックグラウンドで送信
+SLACK_CHUNK_CHARS = int(os.getenv("SLACK_CHUNK_CHARS", "3500"))  # 1投稿あたりの最大文字数
+SLACK_COALESCE_SECONDS = float(os.getenv("SLACK_COALESCE_SECONDS", "1.0"))  # まとめて送るまでの待ち時間
+SLACK_RATE = float(os.getenv("SLACK_RATE", "1.0"))  # 1秒あたりの投稿数（chat.postMessageの目安）
+SLACK_MAX_RETRIES = 5
+
+_STOP = object()
+
+
+# ===============================
+# ② 長文の分割
+# ===============================
+def split_message(text, limit=SLACK_CHUNK_CHARS):
+    """改行位置で区切り、limit文字以内のチャンクに分割（長すぎる行はそのまま切る）"""
+    chunks, current = [], ""
+    for line in text.split("\n"):
+        while len(line) > limit:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > limit:
+            chunks.append(current)
+            candidate = line
+        current = candidate
+    if current or not chunks:
+        chunks.append(current)
+    return chunks
 
-# Slack通知クラス
+
+def pack_messages(messages, limit=SLACK_CHUNK_CHARS):
+    """同じチャンネル宛ての複数メッセージを、上限文字数に収まる投稿にまとめる"""
+    posts = []
+    for message in messages:
+        for chunk in split_message(message, limit):
+            if posts and len(posts[-1]) + 2 + len(chunk) <= limit:
+                posts[-1] = f"{posts[-1]}\n\n{chunk}"
+            else:
+                posts.append(chunk)
+    return posts
+
+
+# ===============================
+# ③ Slack通知クラス
+# ===============================
 class SlackNotifier:
-    def __init__(self, bot_token):
-        self.client = WebClient(token=bot_token)
-
-    def send_message(self, channel, message):
-        try:
-            response = self.client.chat_postMessage(
-                channel=channel,
-                text=message
-            )
-            print(f"✅ Slack通知成功: {response['ts']}")
-        except SlackApiError as e:
-            print(f"❌ Slack通知失敗: {e.response['error']}")
+    """queued=Trueなら送信をバックグラウンドスレッドに任せ、呼び出し元を待たせない"""
+
+    def __init__(self, bot_token=None, queued=SLACK_QUEUE):
+        if bot_token:
+            from slack_sdk import WebClient
+            self.client = WebClient(token=bot_token)
+        else:
+            self.client = clients.get_slack()
+        self.queued = queued
+        self.bucket = TokenBucket(rate=SLACK_RATE, capacity=1, min_rate=SLACK_RATE / 8)
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self._registered = False
+
+    def send_message(self, channel, message, wait=False):
+        """wait=True（またはキューなし）なら送信し終えるまで待ち、全投稿が成功したかを返す"""
+        if wait or not self.queued:
+            return self._deliver(channel, [message])
+        self._ensure_worker()
+        self._queue.put((channel, message))
+
+    def _post(self, channel, text):
+        """1投稿を送信。429ならRetry-Afterだけ待って再送する"""
+        for attempt in range(SLACK_MAX_RETRIES):
+            self.bucket.acquire()
+            try:
+                with metrics.timer("slack_post_seconds"):
+                    response = self.client.chat_postMessage(channel=channel, text=text)
+                self.bucket.on_success()
+                metrics.inc("slack_posts_total")
+                return response
+            except SlackApiError as e:
+                if e.response.status_code != 429 or attempt == SLACK_MAX_RETRIES - 1:
+                    raise
+                retry_after = parse_retry_after(e.response.headers.get("Retry-After"), default=1.0)
+                metrics.inc("slack_retries_total")
+                print(f"⏳ Slackのレート制限: {retry_after:.0f} 秒待って再送します")
+                self.bucket.on_throttle(retry_after)
+
+    def _deliver(self, channel, messages):
+        posts = pack_messages(messages)
+        delivered = True
+        for i, text in enumerate(posts, 1):
+            try:
+                response = self._post(channel, text)
+                part = f"（{i}/{len(posts)}）" if len(posts) > 1 else ""
+                print(f"✅ Slack通知成功{part}: {response['ts']}")
+            except SlackApiError as e:
+                print(f"❌ Slack通知失敗: {e.response['error']}")
+                delivered = False
+            except Exception as e:
+                print(f"❌ Slack通知失敗: {e}")
+                delivered = False
+        return delivered
+
+    # ===============================
+    # ④ キューモード（バックグラウンド送信）
+    # ===============================
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="slack-notifier", daemon=True)
+                self._worker.start()
+                if not self._registered:
+                    atexit.register(self.close)
+                    self._registered = True
+
+    def _drain(self, first):
+        """少し待ってから溜まった分をまとめて取り出し、チャンネルごとに順序を保って束ねる"""
+        batch, stop = [first], False
+        time.sleep(SLACK_COALESCE_SECONDS)
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                stop = True
+                self._queue.task_done()
+                continue
+            batch.append(item)
+
+        by_channel = {}
+        for channel, message in batch:
+            by_channel.setdefault(channel, []).append(message)
+        return by_channel, len(batch), stop
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                self._queue.task_done()
+                return
+            by_channel, count, stop = self._drain(first)
+            try:
+                for channel, messages in by_channel.items():
+                    self._deliver(channel, messages)
+            finally:
+                for _ in range(count):
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def flush(self):
+        """キューに積まれたメッセージが全て送信されるまで待つ"""
+        if self._worker is not None and self._worker.is_alive():
+            self._queue.join()
+
+    def close(self):
+        """未送信分を送り切ってからワーカーを止める（プロセス終了時にも自動で呼ばれる）"""
+        if self._worker is None or not self._worker.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._worker.join()
+        self._worker = None
+
+
+# ===============================
+# ⑤ 共有インスタンス
+# ===============================
+_notifier = None
+_notifier_lock = threading.Lock()
+
+
+def get_notifier():
+    global _notifier
+    with _notifier_lock:
+        if _notifier is None:
+            _notifier = SlackNotifier()
+    return _notifier
+
+
+def notify(channel, message, wait=False):
+    """各レポートから使う送信関数（SLACK_QUEUE=1ならすぐに戻る。wait=Trueなら送信結果を返す）"""
+    return get_notifier().send_message(channel, message, wait=wait)
+
+
+def flush():
+    """共有インスタンスの未送信分を送り切る（送信していなければ何もしない）"""
+    if _notifier is not None:
+        _notifier.close()
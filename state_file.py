@@ -0,0 +1,22 @@
+import os
+import json
+import threading
+
+# ===============================
+# 実行をまたいで残すJSONの状態ファイル（main_api.py / scheduler.py）
+# ===============================
+def load_json(path, default=None):
+    """読めない・壊れている場合はdefault（既定は空の辞書）を返す"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {} if default is None else default
+
+
+def save_json(path, data):
+    """途中で止まっても壊れないよう、一時ファイルに書いてから置き換える"""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
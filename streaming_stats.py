@@ -0,0 +1,192 @@
+import math
+import base64
+import random
+import struct
+
+# ===============================
+# ① 平均・最小・最大（オンライン計算）
+# ===============================
+class RunningStats:
+    """値を保持せずに件数・平均・最小・最大を更新する（Welford法）"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, x):
+        self.count += 1
+        self.mean += (x - self.mean) / self.count
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+
+    def update_many(self, values):
+        """まとめて更新（1件ずつupdateするより速い）"""
+        if not values:
+            return self
+        batch = RunningStats()
+        batch.count = len(values)
+        batch.mean = math.fsum(values) / len(values)
+        batch.min = min(values)
+        batch.max = max(values)
+        return self.merge(batch)
+
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        total = self.count + other.count
+        self.mean += (other.mean - self.mean) * other.count / total
+        self.count = total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+
+# ===============================
+# ② 分位点スケッチ（KLL）
+# ===============================
+class KLLSketch:
+    """固定メモリで中央値などの分位点を近似する、マージ可能なKLLスケッチ"""
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.n = 0
+        self.compactors = [[]]
+        self.max_size = self._capacity(0)
+        self._rng = random.Random(seed)
+
+    def _capacity(self, h):
+        depth = len(self.compactors) - h - 1
+        return int(math.ceil(self.k * (2 / 3) ** depth)) + 1
+
+    def _grow(self):
+        self.compactors.append([])
+        self.max_size = sum(self._capacity(h) for h in range(len(self.compactors)))
+
+    def _size(self):
+        return sum(len(c) for c in self.compactors)
+
+    def _compress(self):
+        for h in range(len(self.compactors)):
+            if len(self.compactors[h]) >= self._capacity(h):
+                if h + 1 >= len(self.compactors):
+                    self._grow()
+                level = sorted(self.compactors[h])
+                # 奇数個なら1つ残し、残りは1つおきに上位レベルへ（重み2倍）
+                keep = [level.pop()] if len(level) % 2 else []
+                offset = self._rng.randint(0, 1)
+                self.compactors[h + 1].extend(level[offset::2])
+                self.compactors[h] = keep
+                if self._size() < self.max_size:
+                    break
+
+    def update(self, x):
+        self.compactors[0].append(x)
+        self.n += 1
+        if self._size() >= self.max_size:
+            self._compress()
+
+    def update_many(self, values):
+        """まとめて追加し、上限を超えた分だけ圧縮する"""
+        self.compactors[0].extend(values)
+        self.n += len(values)
+        while self._size() >= self.max_size:
+            before = self._size()
+            self._compress()
+            if self._size() >= before:
+                break
+
+    def merge(self, other):
+        while len(self.compactors) < len(other.compactors):
+            self._grow()
+        for h, items in enumerate(other.compactors):
+            self.compactors[h].extend(items)
+        self.n += other.n
+        while self._size() >= self.max_size:
+            before = self._size()
+            self._compress()
+            if self._size() >= before:
+                break
+        return self
+
+    def _weighted(self):
+        return sorted(
+            (x, 2 ** h) for h, items in enumerate(self.compactors) for x in items
+        )
+
+    def quantiles(self, qs):
+        """複数の分位点（0〜1）をまとめて返す"""
+        weighted = self._weighted()
+        if not weighted:
+            return [math.nan for _ in qs]
+        total = sum(w for _, w in weighted)
+        results = []
+        for q in qs:
+            target = q * total
+            acc = 0
+            value = weighted[-1][0]
+            for x, w in weighted:
+                acc += w
+                if acc >= target:
+                    value = x
+                    break
+            results.append(value)
+        return results
+
+    def quantile(self, q):
+        return self.quantiles([q])[0]
+
+    def to_dict(self):
+        """JSONで保存できる形にする（各レベルの値をfloat32で連結しbase64にする）"""
+        values = [x for items in self.compactors for x in items]
+        return {
+            "k": self.k,
+            "n": self.n,
+            "sizes": [len(items) for items in self.compactors],
+            "values": base64.b64encode(struct.pack(f"<{len(values)}f", *values)).decode("ascii"),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """to_dictで保存したスケッチを復元する（続けてupdate・mergeできる）"""
+        sketch = cls(k=data["k"])
+        raw = base64.b64decode(data["values"])
+        values = struct.unpack(f"<{len(raw) // 4}f", raw)
+        sketch.compactors = []
+        start = 0
+        for size in data["sizes"]:
+            sketch.compactors.append(list(values[start:start + size]))
+            start += size
+        sketch.compactors = sketch.compactors or [[]]
+        sketch.max_size = sum(sketch._capacity(h) for h in range(len(sketch.compactors)))
+        sketch.n = data["n"]
+        return sketch
+
+
+# ===============================
+# ③ 上位K件カウンター（Misra-Gries）
+# ===============================
+class TopKCounter:
+    """保持するキー数を上限付きに保つ頻出キーワードカウンター"""
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.counts = {}
+
+    def update(self, keys):
+        counts = self.counts
+        for key in keys:
+            counts[key] = counts.get(key, 0) + 1
+        if len(counts) > 2 * self.capacity:
+            self._prune()
+
+    def _prune(self):
+        # capacity+1番目の件数を全体から差し引き、0以下になったキーを捨てる
+        threshold = sorted(self.counts.values(), reverse=True)[self.capacity]
+        self.counts = {k: c - threshold for k, c in self.counts.items() if c > threshold}
+
+    def most_common(self, n):
+        return sorted(self.counts.items(), key=lambda kv: kv[1], reverse=True)[:n]
@@ -0,0 +1,93 @@
+import os
+import time
+import random
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import item_records
+
+# ===============================
+# ① バルク書き込みの設定
+# ===============================
+BULK_CHUNK_SIZE = int(os.getenv("SUPABASE_BULK_CHUNK_SIZE", "500"))
+BULK_MAX_RETRIES = int(os.getenv("SUPABASE_BULK_MAX_RETRIES", "4"))
+BULK_CONCURRENCY = int(os.getenv("SUPABASE_BULK_CONCURRENCY", "1"))
+BULK_BACKOFF = 0.5  # 秒（再試行ごとに2倍）
+ITEMS_TABLE = "sales_items"
+
+
+# ===============================
+# ② アイテム単位の行に変換
+# ===============================
+def to_item_rows(items, category_id, run_date=None):
+    """出品レコードをsales_itemsテーブルの行に変換"""
+    run_date = run_date or datetime.now().strftime("%Y-%m-%d")
+    rows = []
+    for item in item_records.as_records(items):
+        if not item.item_id:
+            continue
+        rows.append({
+            "item_id": item.item_id,
+            "run_date": run_date,
+            "category": str(category_id),
+            "title": item.title,
+            "price": None if item.price != item.price else item.price,
+            "currency": item.currency,
+            "seller": item.seller,
+            "sold_date": item.sold_date,
+        })
+    return rows
+
+
+# ===============================
+# ③ チャンク分割＋リトライ付きのupsert
+# ===============================
+def _dedupe(rows, key):
+    """同じキーが1回のupsertに2回含まれるとPostgreSQLが拒否するため、後勝ちで1件にまとめる"""
+    latest = {}
+    for row in rows:
+        latest[row[key]] = row
+    return list(latest.values())
+
+
+def _write_chunk(client, table, chunk, on_conflict, max_retries):
+    for attempt in range(max_retries + 1):
+        try:
+            with metrics.timer("supabase_write_seconds", table=table):
+                client.table(table).upsert(chunk, on_conflict=on_conflict, returning="minimal").execute()
+            metrics.inc("supabase_rows_total", len(chunk), table=table)
+            return True
+        except Exception as e:
+            if attempt == max_retries:
+                print(f"⚠️ Supabaseバルク保存エラー（{len(chunk)}件・再試行上限）: {e}")
+                return False
+            metrics.inc("supabase_retries_total", table=table)
+            wait = BULK_BACKOFF * (2 ** attempt) * (1 + random.random())
+            print(f"⏳ Supabase保存を再試行します（{attempt + 1}/{max_retries}、{wait:.1f}秒後）: {e}")
+            time.sleep(wait)
+
+
+def bulk_upsert(client, rows, table=ITEMS_TABLE, on_conflict="item_id",
+                chunk_size=None, max_retries=None, concurrency=None):
+    """行をチャンクに分けて冪等にupsertし、(保存件数, 失敗件数)を返す"""
+    chunk_size = chunk_size or BULK_CHUNK_SIZE
+    max_retries = BULK_MAX_RETRIES if max_retries is None else max_retries
+    concurrency = concurrency or BULK_CONCURRENCY
+
+    rows = _dedupe(rows, on_conflict)
+    chunks = [rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size)]
+
+    def write(chunk):
+        return _write_chunk(client, table, chunk, on_conflict, max_retries)
+
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(write, chunks))
+    else:
+        results = [write(chunk) for chunk in chunks]
+
+    saved = sum(len(chunk) for chunk, ok in zip(chunks, results) if ok)
+    failed = len(rows) - saved
+    print(f"✅ Supabaseバルク保存: {saved} 件（{len(chunks)} チャンク、失敗 {failed} 件）")
+    return saved, failed
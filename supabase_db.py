@@ -1,12 +1,5 @@
-from supabase import create_client
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+import clients
+import metrics
 
 def save_sales_data(category, total, avg, median, top_keywords, top_characters):
     """リサーチ結果をSupabaseに保存"""
@@ -20,7 +13,8 @@ def save_sales_data(category, total, avg, median, top_keywords, top_characters):
             "top_keywords": top_keywords,
             "top_characters": top_characters
         }
-        supabase.table("sales_data").insert(data).execute()
+        with metrics.timer("supabase_write_seconds", table="sales_data"):
+            clients.get_supabase().table("sales_data").insert(data).execute()
         print("✅ Supabaseへ保存完了！")
     except Exception as e:
         print(f"⚠️ Supabase保存エラー: {e}")
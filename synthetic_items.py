@@ -0,0 +1,121 @@
+import argparse
+import json
+from functools import lru_cache
+
+import numpy as np
+
+# ===============================
+# ① 合成データの設定
+# ===============================
+# Browse APIのitemSummariesと同じ形のデータを、シードから決定的に生成する。
+# BLOCK件ごとに独立した乱数列を使うので、何件目からでも同じ内容を再現できる
+# （モックサーバーは1000万件でも必要なページ分だけ生成すればよい）。
+
+BLOCK = 1000
+SIZES = {"1k": 1_000, "100k": 100_000, "10m": 10_000_000}
+
+CHARACTERS = ["charizard", "pikachu", "mewtwo", "eevee", "gengar", "lugia", "rayquaza", "snorlax",
+              "mew", "umbreon", "sylveon", "greninja", "lucario", "gardevoir", "dragonite", "blastoise"]
+SETS = ["base set", "vmax climax", "shiny star v", "vstar universe", "eevee heroes", "pokemon 151",
+        "crimson haze", "terastal festival", "paradigm trigger", "lost abyss"]
+RARITIES = ["SAR", "SR", "UR", "AR", "CHR", "HR", "RR", "holo", "reverse holo", "promo"]
+GRADES = ["", "", "", "PSA 10", "PSA 9", "BGS 9.5", "CGC 10"]
+EXTRAS = ["", "", "japanese", "japan", "mint", "near mint", "sealed", "booster box", "lot"]
+EXCLUDED = ["yugioh", "one piece", "weiss", "digimon", "dragon ball"]
+SELLERS_JP = [f"japan_card_{i}" for i in range(200)] + [f"tokyo-japan-tcg{i}" for i in range(50)]
+SELLERS_OTHER = [f"cardshop_{i}" for i in range(300)]
+
+START = np.datetime64("2026-01-01T00:00:00", "s")  # soldDateの起点
+SPAN_SECONDS = 90 * 24 * 3600
+
+
+def parse_size(value):
+    """1k / 100k / 10m などの表記を件数に変換"""
+    value = str(value).lower()
+    if value in SIZES:
+        return SIZES[value]
+    for suffix, scale in (("k", 1_000), ("m", 1_000_000)):
+        if value.endswith(suffix):
+            return int(float(value[:-1]) * scale)
+    return int(value)
+
+
+# ===============================
+# ② ブロック単位の生成
+# ===============================
+@lru_cache(maxsize=64)
+def _block(seed, block):
+    """block番目のBLOCK件を生成（同じseed・blockなら常に同じ内容）"""
+    rng = np.random.default_rng([seed, block])
+    n = BLOCK
+    chars = rng.integers(0, len(CHARACTERS), n).tolist()
+    sets = rng.integers(0, len(SETS), n).tolist()
+    rarities = rng.integers(0, len(RARITIES), n).tolist()
+    grades = rng.integers(0, len(GRADES), n).tolist()
+    extras = rng.integers(0, len(EXTRAS), n).tolist()
+    numbers = rng.integers(1, 300, n).tolist()
+    excluded = (rng.random(n) < 0.05).tolist()
+    excluded_word = rng.integers(0, len(EXCLUDED), n).tolist()
+    japan_seller = (rng.random(n) < 0.7).tolist()
+    seller_jp = rng.integers(0, len(SELLERS_JP), n).tolist()
+    seller_other = rng.integers(0, len(SELLERS_OTHER), n).tolist()
+    # 価格は対数正規分布（一部は上限20000ドル超の高額品）
+    prices = np.char.mod("%.2f", np.exp(rng.normal(3.8, 1.2, n))).tolist()
+    seconds = rng.integers(0, SPAN_SECONDS, n)
+    sold = (START + seconds).astype(str).tolist()
+
+    items = []
+    first_id = 1_000_000_000 + block * BLOCK
+    for j in range(n):
+        words = [CHARACTERS[chars[j]], RARITIES[rarities[j]], f"{numbers[j]:03d}", SETS[sets[j]],
+                 GRADES[grades[j]], "pokemon card", EXTRAS[extras[j]]]
+        if excluded[j]:
+            words.insert(0, EXCLUDED[excluded_word[j]])
+        seller = SELLERS_JP[seller_jp[j]] if japan_seller[j] else SELLERS_OTHER[seller_other[j]]
+        items.append({
+            "itemId": f"v1|{first_id + j}|0",
+            "title": " ".join(w for w in words if w).title(),
+            "price": {"value": prices[j], "currency": "USD"},
+            "seller": {"username": seller, "feedbackPercentage": "99.8", "feedbackScore": numbers[j] * 7},
+            "condition": "Used",
+            "itemEndDate": f"{sold[j]}.000Z",
+            "itemWebUrl": f"https://www.ebay.com/itm/{first_id + j}",
+            "categories": [{"categoryId": "183454", "categoryName": "CCG Individual Cards"}],
+        })
+    return items
+
+
+def get_items(offset, limit, total, seed=0):
+    """offsetからlimit件（total件で打ち切り）を返す"""
+    end = min(offset + limit, total)
+    items = []
+    position = offset
+    while position < end:
+        block, start = divmod(position, BLOCK)
+        chunk = _block(seed, block)[start:start + (end - position)]
+        items.extend(chunk)
+        position += len(chunk)
+    return items
+
+
+def iter_pages(total, page_size=200, seed=0):
+    """total件をpage_size件ずつのページとして順に返す（メモリ使用量はページ分だけ）"""
+    for offset in range(0, total, page_size):
+        yield get_items(offset, page_size, total, seed)
+
+
+def generate_items(total, seed=0):
+    """total件をリストで返す（大きな件数ではiter_pagesを使う）"""
+    return get_items(0, total, total, seed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Browse API形式の合成データを出力")
+    parser.add_argument("--size", default="1k", help="件数（1k / 100k / 10m または数値）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sample", type=int, default=3, help="表示する件数")
+    args = parser.parse_args()
+
+    total = parse_size(args.size)
+    print(json.dumps({"total": total, "itemSummaries": get_items(0, args.sample, total, args.seed)},
+                     ensure_ascii=False, indent=2))
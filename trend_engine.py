@@ -0,0 +1,121 @@
+import os
+import numpy as np
+import pandas as pd
+
+# ===============================
+# ① 設定
+# ===============================
+TREND_PERIODS = int(os.getenv("TREND_PERIODS", "12"))  # 読み込む過去の回数
+TREND_WINDOW = int(os.getenv("TREND_WINDOW", "4"))  # 移動平均・傾きの窓幅
+WEEKLY_CATEGORY = os.getenv("WEEKLY_CATEGORY", "ポケモンカード")  # 週次レポートが読むsales_dataのカテゴリ
+PAGE_SIZE = 1000
+SCALAR_FIELDS = ["total_sales", "avg_price", "median_price", "min_price"]
+
+
+# ===============================
+# ② 過去N回分をページング取得
+# ===============================
+def load_history(client, periods=TREND_PERIODS, category=WEEKLY_CATEGORY):
+    """sales_dataを新しい順にページングで取得し、古い順のリストで返す（同じ日の行はrun_at順）"""
+    rows = []
+    while len(rows) < periods:
+        size = min(PAGE_SIZE, periods - len(rows))
+        query = client.table("sales_data").select("*")
+        if category:
+            query = query.eq("category", category)
+        query = query.order("date", desc=True).order("run_at", desc=True, nullsfirst=False)
+        page = query.range(len(rows), len(rows) + size - 1).execute().data
+        rows.extend(page)
+        if len(page) < size:
+            break
+    return rows[::-1]
+
+
+# ===============================
+# ③ 行列化（回 × キーワード / 回 × キャラ）
+# ===============================
+def build_frames(rows):
+    """履歴行から (回×指標)・(回×キーワード)・(回×キャラ平均価格) のDataFrameを作る"""
+    index = pd.Index([row.get("date") for row in rows], name="date")
+    scalars = pd.DataFrame(
+        [{field: row.get(field) for field in SCALAR_FIELDS} for row in rows], index=index
+    ).apply(pd.to_numeric, errors="coerce")
+    keywords = pd.DataFrame(
+        [row.get("top_keywords") or {} for row in rows], index=index
+    ).fillna(0).astype(float)
+    characters = pd.DataFrame(
+        [
+            {name: (v.get("avg") if v.get("count") else np.nan) for name, v in (row.get("top_characters") or {}).items()}
+            for row in rows
+        ],
+        index=index,
+        dtype=float,
+    )
+    return scalars, keywords, characters
+
+
+# ===============================
+# ④ 指標計算（移動平均・EWMA・zスコア・傾き）
+# ===============================
+def _slope(values):
+    """各列の直近窓に対する最小二乗の傾き（欠損は除外）"""
+    y = np.asarray(values, dtype=float)
+    x = np.arange(y.shape[0], dtype=float)[:, None]
+    mask = ~np.isnan(y)
+    n = mask.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x_mean = np.where(mask, x, 0).sum(axis=0) / n
+        y_mean = np.where(mask, y, 0).sum(axis=0) / n
+        dx = np.where(mask, x - x_mean, 0)
+        dy = np.where(mask, y - y_mean, 0)
+        slope = (dx * dy).sum(axis=0) / (dx * dx).sum(axis=0)
+    return np.where(n >= 2, slope, np.nan)
+
+
+def trend_metrics(frame, window=TREND_WINDOW):
+    """各列の最新値に対する移動平均・EWMA・zスコア・傾きをまとめて計算"""
+    if frame.empty:
+        return pd.DataFrame(columns=["last", "rolling_mean", "ewma", "zscore", "slope"])
+    history = frame.shift(1)
+    rolling_mean = history.rolling(window, min_periods=2).mean()
+    rolling_std = history.rolling(window, min_periods=2).std()
+    # 変動がほぼない列でzスコアが発散しないよう、標準偏差に平均の10%の下限を設ける
+    scale = rolling_std.where(rolling_std > 0.1 * rolling_mean.abs(), 0.1 * rolling_mean.abs())
+    with np.errstate(invalid="ignore", divide="ignore"):
+        zscore = (frame - rolling_mean) / scale.replace(0, np.nan)
+    return pd.DataFrame({
+        "last": frame.iloc[-1],
+        "rolling_mean": rolling_mean.iloc[-1],
+        "ewma": frame.ewm(span=window, adjust=False).mean().iloc[-1],
+        "zscore": zscore.iloc[-1],
+        "slope": _slope(frame.tail(window).to_numpy()),
+    })
+
+
+# ===============================
+# ⑤ レポート（複数回トレンド）
+# ===============================
+def create_trend_section(rows, window=TREND_WINDOW, z_threshold=2.0, top=5):
+    """過去N回の推移から注目キーワード・キャラを抽出した文面を返す"""
+    scalars, keywords, characters = build_frames(rows)
+    msg = f"📚 過去{len(rows)}回のトレンド（窓幅{window}回）\n"
+
+    overall = trend_metrics(scalars, window)
+    for field, label in (("total_sales", "販売件数"), ("avg_price", "平均価格")):
+        if field in overall.index and not np.isnan(overall.at[field, "slope"]):
+            m = overall.loc[field]
+            msg += f"- {label}: EWMA {m['ewma']:.2f} / 傾き {m['slope']:+.2f}/回 / z {m['zscore']:+.2f}\n"
+
+    kw = trend_metrics(keywords, window).dropna(subset=["zscore"])
+    hot = kw[kw["zscore"] >= z_threshold].sort_values("zscore", ascending=False).head(top)
+    if not hot.empty:
+        msg += "🔥 急上昇キーワード: " + ", ".join(f"{k}(z{v:+.1f})" for k, v in hot["zscore"].items()) + "\n"
+
+    ch = trend_metrics(characters, window).dropna(subset=["slope"])
+    rising = ch[ch["zscore"] >= z_threshold].sort_values("zscore", ascending=False).head(top)
+    falling = ch[ch["zscore"] <= -z_threshold].sort_values("zscore").head(top)
+    if not rising.empty:
+        msg += "📈 価格上昇トレンド: " + ", ".join(f"{k}(傾き{v:+.1f})" for k, v in rising["slope"].items()) + "\n"
+    if not falling.empty:
+        msg += "📉 価格下落トレンド: " + ", ".join(f"{k}(傾き{v:+.1f})" for k, v in falling["slope"].items()) + "\n"
+    return msg
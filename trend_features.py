@@ -0,0 +1,97 @@
+import os
+import numpy as np
+
+import trend_engine
+
+try:
+    import tiktoken
+except ImportError:  # tiktokenがなければ文字数から概算する
+    tiktoken = None
+
+# ===============================
+# ① 設定
+# ===============================
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1500"))
+TOP_MOVERS = int(os.getenv("PROMPT_TOP_MOVERS", "8"))
+
+
+def count_tokens(text, model="gpt-4o-mini"):
+    """プロンプトのトークン数（tiktokenがなければ ASCII 4文字=1、それ以外1文字=1 で概算）"""
+    if tiktoken is not None:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("o200k_base")
+        return len(encoding.encode(text))
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars)
+
+
+# ===============================
+# ② 特徴量（前回差・傾き・変動率）
+# ===============================
+def entity_features(frame, window=trend_engine.TREND_WINDOW):
+    """各列の最新値・前回差・変化率・傾き・変動率（変化率の標準偏差）を計算"""
+    metrics = trend_engine.trend_metrics(frame, window)
+    values = frame.to_numpy(dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pct = np.diff(values, axis=0) / np.abs(values[:-1]) * 100
+    pct[~np.isfinite(pct)] = np.nan
+    last_pct = pct[-1] if len(pct) else np.full(values.shape[1], np.nan)
+    with np.errstate(invalid="ignore"):
+        volatility = np.nanstd(pct[-window:], axis=0) if len(pct) else np.full(values.shape[1], np.nan)
+    metrics["delta"] = values[-1] - values[-2] if len(values) > 1 else np.nan
+    metrics["pct"] = last_pct
+    metrics["volatility"] = volatility
+    return metrics
+
+
+def _movers(features, column, top):
+    ranked = features.dropna(subset=[column])
+    return ranked.reindex(ranked[column].abs().sort_values(ascending=False).index).head(top)
+
+
+def build_feature_table(rows, top=TOP_MOVERS):
+    """履歴行を、期間数に依存しない固定サイズの表（テキスト）に変換"""
+    scalars, keywords, characters = trend_engine.build_frames(rows)
+    lines = [f"期間: {rows[0].get('date')} 〜 {rows[-1].get('date')}（{len(rows)}回分）"]
+
+    lines.append("■ 市場全体（最新値 / 前回比% / 傾き/回 / 変動率%）")
+    overall = entity_features(scalars)
+    for field, label in (("total_sales", "販売件数"), ("avg_price", "平均価格"), ("median_price", "中央価格"), ("min_price", "最低価格")):
+        if field in overall.index:
+            m = overall.loc[field]
+            lines.append(f"- {label}: {m['last']:.2f} / {m['pct']:+.1f}% / {m['slope']:+.2f} / {m['volatility']:.1f}%")
+
+    lines.append(f"■ キーワード変動TOP{top}（件数 / 前回差 / 傾き/回）")
+    for name, m in _movers(entity_features(keywords), "delta", top).iterrows():
+        lines.append(f"- {name}: {m['last']:.0f} / {m['delta']:+.0f} / {m['slope']:+.2f}")
+
+    lines.append(f"■ キャラ価格変動TOP{top}（平均価格 / 前回比% / 傾き/回 / 変動率%）")
+    for name, m in _movers(entity_features(characters), "pct", top).iterrows():
+        lines.append(f"- {name}: ${m['last']:.2f} / {m['pct']:+.1f}% / {m['slope']:+.2f} / {m['volatility']:.1f}%")
+    return "\n".join(lines)
+
+
+# ===============================
+# ③ トークン予算付きのプロンプト組み立て
+# ===============================
+def build_prompt(header, rows, footer, budget=PROMPT_TOKEN_BUDGET, top=TOP_MOVERS):
+    """予算に収まるまで上位件数を減らし、それでも超えるなら古い回から削って(プロンプト, トークン数)を返す"""
+    # 同じ日の行はrun_at順にする（前回比・傾きが実際の実行順の差になるように）
+    rows = sorted(rows, key=lambda r: (r.get("date") or "", r.get("run_at") or ""))
+    while True:
+        prompt = f"{header}\n{build_feature_table(rows, top)}\n{footer}"
+        tokens = count_tokens(prompt)
+        if tokens <= budget:
+            break
+        if top > 1:
+            top -= 1
+        elif len(rows) > 2:
+            rows = rows[1:]
+        else:
+            print(f"⚠️ プロンプトがトークン予算を超えています（{tokens} > {budget}）。最小の表のまま送信します")
+            break
+
+    print(f"🧮 プロンプトのトークン数: {tokens}（予算 {budget}、上位 {top} 件、{len(rows)} 回分）")
+    return prompt, tokens
@@ -1,48 +1,25 @@
 import os
 import json
 from datetime import datetime
-from supabase import create_client
-from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
-from dotenv import load_dotenv
+import clients
+import slack_notify
 
 # ===============================
 # ① 環境設定
 # ===============================
-load_dotenv()
+clients.load_env()
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-SLACK_TOKEN = os.getenv("SLACK_TOKEN")
 SLACK_CHANNEL = os.getenv("SLACK_CHANNEL", "#profit-finder")
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-slack = WebClient(token=SLACK_TOKEN)
-
 # ===============================
 # ② Slack送信関数
 # ===============================
 def send_slack(message):
-    """Slackにメッセージ送信"""
-    try:
-        slack.chat_postMessage(channel=SLACK_CHANNEL, text=message)
-        print(f"✅ Slack通知成功: {message[:40]}...")
-    except SlackApiError as e:
-        print(f"⚠️ Slack送信エラー: {e.response['error']}")
+    """Slackにメッセージ送信（長文は分割、SLACK_QUEUE=1ならバックグラウンド送信）"""
+    slack_notify.notify(SLACK_CHANNEL, message)
 
 # ===============================
-# ③ Supabaseから最新データ2件を取得
-# ===============================
-def get_latest_data():
-    res = supabase.table("sales_data").select("*").order("date", desc=True).limit(2).execute()
-    data = res.data
-    if len(data) < 2:
-        print("⚠️ 比較できるデータが2件未満です。")
-        return None, None
-    return data[1], data[0]  # (前回, 最新)
-
-# ===============================
-# ④ 変化率を計算
+# ③ 変化率を計算
 # ===============================
 def calc_change(old, new, field):
     try:
@@ -55,7 +32,7 @@ def calc_change(old, new, field):
         return 0
 
 # ===============================
-# ⑤ レポート生成
+# ④ レポート生成
 # ===============================
 def create_report(old, new):
     avg_change = calc_change(old, new, "avg_price")
@@ -100,18 +77,26 @@ def create_report(old, new):
     return msg
 
 # ===============================
-# ⑥ メイン処理
+# ⑤ メイン処理
 # ===============================
-def main():
-    old, new = get_latest_data()
-    if not new or not old:
+def main(history=None):
+    # 過去N回分を1回のページング取得で読み込み、直近2回の比較と複数回トレンドに使う
+    # （pipeline.pyからは取得済みの履歴を受け取る）
+    import trend_engine  # pandasは使うときだけ読み込む
+    if history is None:
+        history = trend_engine.load_history(clients.get_supabase(), trend_engine.TREND_PERIODS)
+    if len(history) < 2:
+        print("⚠️ 比較できるデータが2件未満です。")
         return
+    old, new = history[-2], history[-1]
     report = create_report(old, new)
+    if len(history) > 2:
+        report += "\n" + trend_engine.create_trend_section(history)
     print("\n" + report)
     send_slack(report)
 
 # ===============================
-# ⑦ 実行
+# ⑥ 実行
 # ===============================
 if __name__ == "__main__":
     main()